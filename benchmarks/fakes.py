@@ -0,0 +1,220 @@
+"""Deterministic local stand-ins for the chat models and the Tavily client.
+
+Latencies are drawn from a configurable distribution with a seed derived from
+the request itself, so a given prompt always gets the same latency and the same
+response whatever the scheduling order. Behaviour is scripted from the bound
+tools:
+
+* models bound to ``tavily_search`` (research agents) run ``search_rounds``
+  rounds of ``searches_per_round`` searches plus a think_tool call, then answer;
+* models bound to ``ConductResearch`` (planners and supervisor) launch
+  ``fanout`` research topics for ``research_rounds`` rounds, then complete;
+* structured-output models fill every field of their schema;
+* plain models answer with ``response_words`` words.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+@dataclass
+class LatencyDistribution:
+    """Latency distribution in seconds: constant, uniform or lognormal."""
+    kind: str = "lognormal"
+    median: float = 0.05
+    sigma: float = 0.5
+    low: float = 0.0
+    high: float = 0.1
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "constant":
+            return self.median
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high)
+        return rng.lognormvariate(0, self.sigma) * self.median
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """Parse "constant:0.05", "uniform:0.01:0.2" or "lognormal:0.05:0.5"."""
+        kind, *values = spec.split(":")
+        values = [float(v) for v in values]
+        if kind == "constant":
+            return cls(kind, median=values[0])
+        if kind == "uniform":
+            return cls(kind, low=values[0], high=values[1])
+        return cls(kind, median=values[0], sigma=values[1] if len(values) > 1 else 0.5)
+
+
+@dataclass
+class FakeBackendConfig:
+    """Shape of the fake workload."""
+    llm_latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    search_latency: LatencyDistribution = field(default_factory=lambda: LatencyDistribution(median=0.1))
+    response_words: int = 200
+    result_words: int = 300
+    search_results: int = 3
+    search_rounds: int = 2
+    searches_per_round: int = 2
+    research_rounds: int = 1
+    fanout: int = 3
+    seed: int = 0
+
+
+def _rng(config: FakeBackendConfig, *parts: str) -> random.Random:
+    digest = hashlib.sha256("\x00".join((str(config.seed),) + parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _words(rng: random.Random, count: int) -> str:
+    vocabulary = ("inflation", "rates", "growth", "labour", "market", "central", "bank", "policy", "outlook", "data")
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model stand-in, a real BaseChatModel so callbacks and tracing behave as in production."""
+
+    model_name: str
+    backend: Any
+    schema_: Optional[type] = None
+
+    # Calls per model name, across every bound variant
+    calls_by_model: ClassVar[Counter] = Counter()
+
+    def __init__(self, model: str, backend: FakeBackendConfig, schema=None, **kwargs):
+        super().__init__(model_name=model, backend=backend, schema_=schema)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tool_names=[getattr(tool, "name", getattr(tool, "__name__", "")) for tool in tools])
+
+    def with_structured_output(self, schema, **kwargs):
+        model = FakeChatModel(self.model_name, self.backend, schema=schema)
+        return model | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+    def _generate(self, messages, stop=None, run_manager=None, tool_names=(), **kwargs) -> ChatResult:
+        FakeChatModel.calls_by_model[self.model_name] += 1
+        time.sleep(self.backend.llm_latency.sample(_rng(self.backend, self.model_name, str(messages))))
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, tool_names))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tool_names=(), **kwargs) -> ChatResult:
+        FakeChatModel.calls_by_model[self.model_name] += 1
+        await asyncio.sleep(self.backend.llm_latency.sample(_rng(self.backend, self.model_name, str(messages))))
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, tool_names))])
+
+    def _respond(self, messages, tool_names) -> AIMessage:
+        text = str(messages)
+        rng = _rng(self.backend, "response", self.model_name, text)
+        usage = {
+            "input_tokens": len(text) // 4,
+            "output_tokens": self.backend.response_words,
+            "total_tokens": len(text) // 4 + self.backend.response_words,
+        }
+
+        if self.schema_ is not None:
+            values = {}
+            for name, info in self.schema_.model_fields.items():
+                values[name] = True if info.annotation is bool else _words(rng, self.backend.response_words // 4)
+            return AIMessage(content=json.dumps(values), usage_metadata=usage)
+
+        if "tavily_search" in tool_names:
+            rounds_done = sum(1 for m in messages if isinstance(m, AIMessage) and m.tool_calls)
+            if rounds_done < self.backend.search_rounds:
+                tool_calls = [
+                    _tool_call(rng, "tavily_search", {"query": f"query {rounds_done}-{i} {_words(rng, 3)}"})
+                    for i in range(self.backend.searches_per_round)
+                ] + [_tool_call(rng, "think_tool", {"reflection": _words(rng, 40)})]
+                return AIMessage(content="", tool_calls=tool_calls, usage_metadata=usage)
+
+        if "ConductResearch" in tool_names:
+            rounds_done = text.count("'research_topic'") // max(self.backend.fanout, 1)
+            if rounds_done < self.backend.research_rounds:
+                tool_calls = [
+                    _tool_call(rng, "ConductResearch", {"research_topic": f"topic {rounds_done}-{i}: {_words(rng, 30)}"})
+                    for i in range(self.backend.fanout)
+                ]
+            else:
+                tool_calls = [_tool_call(rng, "ResearchComplete", {})]
+            return AIMessage(content="", tool_calls=tool_calls, usage_metadata=usage)
+
+        return AIMessage(content=_words(rng, self.backend.response_words), usage_metadata=usage)
+
+
+def _tool_call(rng: random.Random, name: str, args: dict) -> dict:
+    return {"name": name, "args": args, "id": f"call_{rng.getrandbits(48):012x}", "type": "tool_call"}
+
+
+class FakeTavilyClient:
+    """AsyncTavilyClient stand-in returning synthetic results."""
+
+    def __init__(self, backend: FakeBackendConfig):
+        self.backend = backend
+        self.calls = 0
+
+    async def search(self, query: str, max_results: Optional[int] = None, include_raw_content: bool = False, topic: str = "general", **kwargs) -> dict:
+        self.calls += 1
+        rng = _rng(self.backend, "search", query, topic)
+        await asyncio.sleep(self.backend.search_latency.sample(rng))
+        results = []
+        for i in range(max_results or self.backend.search_results):
+            result = {
+                "url": f"https://example.org/{hashlib.sha1(f'{query}-{i}'.encode()).hexdigest()[:12]}",
+                "title": f"Result {i} for {query}",
+                "content": _words(rng, self.backend.result_words),
+                "score": rng.random(),
+            }
+            if include_raw_content:
+                result["raw_content"] = _words(rng, self.backend.result_words * 10)
+            results.append(result)
+        return {"query": query, "results": results}
+
+
+def install_fakes(backend: FakeBackendConfig, workdir: str) -> FakeTavilyClient:
+    """Route every model and Tavily call of the graph modules to the fakes.
+
+    Caches and the artifact store are redirected under workdir so runs never
+    touch data/ and never share cached results.
+
+    Args:
+        backend: Shape of the fake workload
+        workdir: Scratch directory for caches and artifacts
+
+    Returns:
+        The fake Tavily client, exposing its call count
+    """
+    import tools.models as models
+    import tools.search as search
+    import tools.artifacts as artifacts
+    from tools.cache import SearchCache, SummaryCache
+
+    models.init_chat_model = lambda model=None, **kwargs: FakeChatModel(model, backend, **kwargs)
+    models.model_registry.clear()
+    FakeChatModel.calls_by_model.clear()
+
+    tavily = FakeTavilyClient(backend)
+    search._async_tavily_client = tavily
+    search.search_cache = SearchCache(path=f"{workdir}/search_results.sqlite")
+    search.summary_cache = SummaryCache(path=f"{workdir}/webpage_summaries.sqlite")
+    artifacts.artifact_store = artifacts.ArtifactStore(root=f"{workdir}/runs")
+    try:
+        import app
+        app.default_artifact_store = artifacts.artifact_store
+    except ImportError:
+        pass
+    return tavily
@@ -0,0 +1,259 @@
+"""Offline end-to-end benchmark of the research graphs.
+
+Runs MacroAgent, ResearchSystem, ResearchLeadAgent and ResearchAgent against the
+deterministic fakes of benchmarks/fakes.py, so no API key or network is needed
+and no money is spent. For each graph and concurrency level (number of
+invocations running at once) it reports wall-clock time, throughput, per-node
+time, LLM and search call counts, peak memory and event-loop utilization.
+
+Usage (from the repository root):
+
+    python benchmarks/run.py --graph macro --concurrency 1,4,16 --output bench.json
+    python benchmarks/run.py --llm-latency lognormal:0.2:0.6 --search-latency constant:0.3 --fanout 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from tools.metrics import metrics
+
+from fakes import FakeBackendConfig, FakeChatModel, LatencyDistribution, install_fakes
+
+GRAPHS = ("macro", "research_system", "research_lead_agent", "research_agent")
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Callback handler accumulating the wall time spent in each graph node."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._starts = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node runnable itself, not the runnables nested inside it
+        if node is not None and kwargs.get("name") == node:
+            self._starts[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def _finish(self, run_id):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            node, start = started
+            self.durations[node].append(time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        return {
+            node: {
+                "calls": len(values),
+                "total_s": sum(values),
+                "mean_s": statistics.mean(values),
+                "max_s": max(values),
+            }
+            for node, values in sorted(self.durations.items())
+        }
+
+
+class LoopMonitor:
+    """Measure event-loop lag by sampling how late a periodic sleep wakes up."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - start - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+    def summary(self) -> dict:
+        if not self.lags:
+            return {"samples": 0}
+        lags = sorted(self.lags)
+        return {
+            "samples": len(lags),
+            "lag_ms_p50": lags[len(lags) // 2] * 1000,
+            "lag_ms_p99": lags[min(int(len(lags) * 0.99), len(lags) - 1)] * 1000,
+            "lag_ms_max": lags[-1] * 1000,
+        }
+
+
+def build_graph(name: str, llm_config: dict):
+    """Build the graph under test with an empty compile config."""
+    if name == "macro":
+        from app import MacroAgent
+        return MacroAgent(llm_config=llm_config, compile_config={})
+    if name == "research_system":
+        from subagents.research_system import ResearchSystem
+        return ResearchSystem(llm_config=llm_config, compile_config={})
+    if name == "research_lead_agent":
+        from subagents.research_lead_agent import ResearchLeadAgent
+        return ResearchLeadAgent(llm_config=llm_config, compile_config={})
+    from subagents.research_agent import ResearchAgent
+    return ResearchAgent(llm_config=llm_config.get("research"), compile_config={})
+
+
+def graph_input(name: str, index: int) -> dict:
+    query = f"Macroeconomic outlook of economy {index}"
+    if name == "macro":
+        return {"user_query": query, "current_state_messages": [], "future_events_messages": []}
+    if name == "research_system":
+        return {"user_query": query, "messages": [HumanMessage(content=query)]}
+    if name == "research_lead_agent":
+        return {"messages": [HumanMessage(content=query)], "research_brief": query}
+    return {"messages": [HumanMessage(content=query)], "research_topic": query}
+
+
+async def run_scenario(name: str, llm_config: dict, backend: FakeBackendConfig, concurrency: int, with_metrics: bool = False) -> dict:
+    """Run concurrency invocations of one graph at once and collect measurements."""
+    with tempfile.TemporaryDirectory() as workdir:
+        tavily = install_fakes(backend, workdir)
+        graph = build_graph(name, llm_config)
+        metrics.reset()
+        # Keep the exported file inside the scratch directory
+        metrics.path = f"{workdir}/metrics.prom"
+        timer = NodeTimer()
+        monitor = LoopMonitor()
+
+        tracemalloc.start()
+        monitor.start()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        latencies = []
+
+        async def invoke(index: int):
+            start = time.perf_counter()
+            await graph.ainvoke(graph_input(name, index), config={"callbacks": [timer], "recursion_limit": 100})
+            latencies.append(time.perf_counter() - start)
+
+        results = await asyncio.gather(*(invoke(i) for i in range(concurrency)), return_exceptions=True)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        await monitor.stop()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    errors = [repr(r) for r in results if isinstance(r, BaseException)]
+    return {
+        "graph": name,
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "throughput_per_s": (concurrency - len(errors)) / wall if wall else 0.0,
+        "latency_s": {
+            "mean": statistics.mean(latencies) if latencies else None,
+            "max": max(latencies) if latencies else None,
+        },
+        "errors": errors,
+        "llm_calls": dict(FakeChatModel.calls_by_model),
+        "search_calls": tavily.calls,
+        "nodes": timer.summary(),
+        "peak_traced_memory_mb": peak_bytes / 2**20,
+        # Fraction of wall time the process spent on CPU, a proxy for event-loop busy time
+        "event_loop": {"cpu_utilization": cpu / wall if wall else 0.0, **monitor.summary()},
+        "metrics": metrics.snapshot() if with_metrics else None,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", action="append", choices=GRAPHS, help="Graph to run (repeatable), defaults to all")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrent invocations to sweep")
+    parser.add_argument("--llm-latency", default="lognormal:0.05:0.5", help="constant:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--search-latency", default="lognormal:0.1:0.5", help="Same format as --llm-latency")
+    parser.add_argument("--response-words", type=int, default=200)
+    parser.add_argument("--result-words", type=int, default=300)
+    parser.add_argument("--search-rounds", type=int, default=2)
+    parser.add_argument("--searches-per-round", type=int, default=2)
+    parser.add_argument("--research-rounds", type=int, default=1)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", default=os.path.join(ROOT_DIR, "config", "llm.yaml"))
+    parser.add_argument("--with-rate-limits", action="store_true", help="Keep the rate_limits section of the config")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--metrics", action="store_true", help="Include the metrics snapshot of every scenario in the report")
+    parser.add_argument("--verbose", action="store_true", help="Keep the graphs' own prints")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    backend = FakeBackendConfig(
+        llm_latency=LatencyDistribution.parse(args.llm_latency),
+        search_latency=LatencyDistribution.parse(args.search_latency),
+        response_words=args.response_words,
+        result_words=args.result_words,
+        search_rounds=args.search_rounds,
+        searches_per_round=args.searches_per_round,
+        research_rounds=args.research_rounds,
+        fanout=args.fanout,
+        seed=args.seed,
+    )
+    llm_config = yaml.safe_load(open(args.config, "rb"))
+    if not args.with_rate_limits:
+        llm_config.pop("rate_limits", None)
+
+    results = []
+    for graph in args.graph or GRAPHS:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            stdout = sys.stdout if args.verbose else io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                result = asyncio.run(run_scenario(graph, llm_config, backend, concurrency, args.metrics))
+            results.append(result)
+            print(
+                f"{graph:<20} x{concurrency:<3} wall {result['wall_s']:7.2f}s  "
+                f"{result['throughput_per_s']:6.2f} runs/s  llm {sum(result['llm_calls'].values()):4d}  "
+                f"search {result['search_calls']:4d}  peak {result['peak_traced_memory_mb']:6.1f} MB  "
+                f"cpu {result['event_loop']['cpu_utilization']:.0%}  errors {len(result['errors'])}",
+                file=sys.stderr,
+            )
+
+    report = {
+        "python": sys.version.split()[0],
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "backend": {k: (v.__dict__ if isinstance(v, LatencyDistribution) else v) for k, v in backend.__dict__.items()},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
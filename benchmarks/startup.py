@@ -0,0 +1,100 @@
+"""Startup benchmark: measure how long importing the graph modules takes.
+
+Each module is imported in a fresh interpreter (``python -X importtime``) with
+the API keys removed from the environment, so the benchmark also checks that
+importing the graph code does not require credentials.
+
+Usage (from the repository root):
+
+    python benchmarks/startup.py --runs 7 --budget-ms 1500
+    python benchmarks/startup.py --module subagents.research_agent --json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DEFAULT_MODULES = ["app", "subagents.research_system", "subagents.research_lead_agent", "subagents.research_agent"]
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def import_once(module: str) -> dict:
+    """Import module in a fresh interpreter and return its timings.
+
+    Args:
+        module: Dotted module name, relative to src/
+
+    Returns:
+        Dictionary with wall time, cumulative import time and per-module self times
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "TAVILY_API_KEY")}
+    env["PYTHONPATH"] = SRC_DIR
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+
+    self_times = {}
+    cumulative_ms = 0.0
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        self_times[name] = int(self_us) / 1000
+        if name == module:
+            cumulative_ms = int(cumulative_us) / 1000
+    return {"wall_ms": wall_ms, "import_ms": cumulative_ms, "self_ms": self_times}
+
+
+def benchmark(module: str, runs: int, top: int) -> dict:
+    """Import module runs times and summarize the timings."""
+    samples = [import_once(module) for _ in range(runs)]
+    last = samples[-1]["self_ms"]
+    return {
+        "module": module,
+        "runs": runs,
+        "wall_ms_median": statistics.median(s["wall_ms"] for s in samples),
+        "import_ms_median": statistics.median(s["import_ms"] for s in samples),
+        "import_ms_min": min(s["import_ms"] for s in samples),
+        "slowest_imports": sorted(last.items(), key=lambda item: item[1], reverse=True)[:top],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to import (repeatable), defaults to the graph modules")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to report")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if a median import time exceeds this budget")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = [benchmark(module, args.runs, args.top) for module in (args.module or DEFAULT_MODULES)]
+    over_budget = [r for r in results if args.budget_ms is not None and r["import_ms_median"] > args.budget_ms]
+
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "budget_ms": args.budget_ms, "results": results}, indent=2))
+    else:
+        for r in results:
+            print(f"{r['module']}: import {r['import_ms_median']:.0f} ms median ({r['import_ms_min']:.0f} ms min), "
+                  f"process {r['wall_ms_median']:.0f} ms over {r['runs']} runs")
+            for name, ms in r["slowest_imports"]:
+                print(f"    {ms:8.1f} ms  {name}")
+        for r in over_budget:
+            print(f"OVER BUDGET: {r['module']} {r['import_ms_median']:.0f} ms > {args.budget_ms:.0f} ms")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
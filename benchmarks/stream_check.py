@@ -0,0 +1,97 @@
+"""Offline check of the events yielded by MacroAgent.astream.
+
+Streams one MacroAgent run against the deterministic fakes of
+benchmarks/fakes.py and checks that ResearchLaunched and ResearchCompleted
+events arrive both for the planners' research and for the research launched
+by the nested research lead agents, one completion per launch.
+
+Usage (from the repository root):
+
+    python benchmarks/stream_check.py
+    python benchmarks/stream_check.py --fanout 2 --verbose
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml
+
+from fakes import FakeBackendConfig, LatencyDistribution, install_fakes
+
+
+async def stream_events(llm_config: dict, backend: FakeBackendConfig) -> list:
+    """Stream one MacroAgent run on the fakes and return its events."""
+    with tempfile.TemporaryDirectory() as workdir:
+        install_fakes(backend, workdir)
+        from app import MacroAgent
+
+        agent = MacroAgent(llm_config=llm_config, compile_config={})
+        query = "Macroeconomic outlook of economy 0"
+        return [
+            event async for event in agent.astream(
+                {"user_query": query, "current_state_messages": [], "future_events_messages": []},
+                config={"recursion_limit": 100}
+            )
+        ]
+
+
+def check(events: list) -> list:
+    """Return the problems found in the events of a run, none when the stream is complete."""
+    launched = Counter()
+    completed = Counter()
+    for event in events:
+        # Planner research has an empty branch path, lead agent research is nested under the planner's call
+        level = "lead" if getattr(event, "branch_path", None) else "planner"
+        if event.type == "research_launched":
+            launched[level] += 1
+        elif event.type == "research_completed":
+            completed[level] += 1
+
+    problems = []
+    for level in ("planner", "lead"):
+        if not launched[level]:
+            problems.append(f"no ResearchLaunched event of the {level} level")
+        if completed[level] != launched[level]:
+            problems.append(f"{launched[level]} {level} research launched but {completed[level]} completed")
+    if not events or events[-1].type != "run_completed":
+        problems.append("the stream does not end with RunCompleted")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--config", default=os.path.join(ROOT_DIR, "config", "llm.yaml"))
+    parser.add_argument("--verbose", action="store_true", help="Keep the graphs' own prints")
+    args = parser.parse_args()
+
+    backend = FakeBackendConfig(
+        llm_latency=LatencyDistribution.parse("constant:0.01"),
+        search_latency=LatencyDistribution.parse("constant:0.01"),
+        fanout=args.fanout,
+    )
+    llm_config = yaml.safe_load(open(args.config, "rb"))
+    llm_config.pop("rate_limits", None)
+
+    stdout = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        events = asyncio.run(stream_events(llm_config, backend))
+
+    print(", ".join(f"{count} {kind}" for kind, count in Counter(event.type for event in events).items()), file=sys.stderr)
+    problems = check(events)
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,33 @@
 from langgraph.graph import MessagesState, START, END, StateGraph
 from langgraph.graph.message import add_messages
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage, AnyMessage, filter_messages
-from langchain.chat_models import init_chat_model
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage, AnyMessage
 
 from typing import Literal, Annotated
 from pydantic import Field
 import asyncio
+import time
 
 from sys import path
 
 path.append("../src/")
-from utils import get_buffer_string
-from prompts import compress_research_system_prompt, compress_research_human_message, current_state_instructions, future_state_instructions
-from tools.others import get_today_str
+from tools.models import get_chat_model, configure_http_pools, model_registry
+from tools.limits import configure_rate_limits
+from tools.hedging import configure_hedging
+from tools.metrics import configure_metrics, instrument
+from tools.checkpoint import with_checkpointer, resume_config
+from prompts import compress_research_system_prompt, compress_research_human_message, current_state_instructions, current_state_transcript_prompt, future_state_instructions
 from subagents.research_lead_agent import ResearchLeadAgent
 from tools.think import think_tool
 from tools.supervise import ResearchComplete, ConductResearch
+from tools.registry import with_run_context, with_branch, get_run_id, get_run_date, get_research_memo, get_branch_path, live_run
+from tools.scheduler import configure_concurrency, concurrency_budget
+from tools.deadline import with_deadline, out_of_time, until_deadline, mark_partial, MACRO_SUMMARIES, AGENT_SUMMARIES, CANCEL_GRACE, RESEARCH_SKIPPED, RESEARCH_CANCELLED
+from tools.memo import memo_threshold
+from tools.transcript import TranscriptRenderer
+from tools.artifacts import ArtifactStore, artifact_store as default_artifact_store
+from tools.fanout import Precompressor, run_in_completion_order, research_message, with_precompressed_content
+from tools.mapreduce import MapReduceSummarizer, research_notes
+from tools.events import MacroEvent, PlannerDecision, ResearchLaunched, ResearchCompleted, PhaseSummary, RunCompleted, emit
 
 
 # graph state
@@ -25,6 +37,8 @@ class MacroAgentState(MessagesState):
     current_state_summary: str
     future_events_messages: Annotated[list[AnyMessage], add_messages] = Field(default=list)
     future_events_summary: str
+    # Set once the time budget of the run stopped the research: summaries are then partial
+    partial: bool
 
 
 # graph flow
@@ -32,30 +46,28 @@ class GetCurrentState:
 
     def __init__(self, llm_config, tools):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model.bind_tools(tools)
+        self.llm = get_chat_model(self._llm_config, tools=tools)
+        # Caches the rendering of each message of the history across iterations
+        self.transcript = TranscriptRenderer.from_config(self._llm_config.get("transcript"))
 
-    async def __call__(self, state):
+    async def __call__(self, state, config):
 
         if not state.get("current_state_messages"):
             state.get("current_state_messages").append(HumanMessage(content=state.get("user_query")))
 
         messages = state.get("current_state_messages")
         
+        # Static instructions first, byte-identical on every iteration of the run, then the
+        # transcript, which only grows at its end: each call hits the provider prompt cache
         response = await self.llm.ainvoke(
             input=[
-                HumanMessage(content=current_state_instructions.format(
-                    messages=get_buffer_string(messages),
-                    date=get_today_str()
+                SystemMessage(content=current_state_instructions.format(date=get_run_date(config))),
+                HumanMessage(content=current_state_transcript_prompt.format(
+                    messages=self.transcript.render(messages)
                 ))
             ]
         )
 
-        print("GetCurrentState", response)
-
         return {"current_state_messages": [response], "messages": [response]}
 
 
@@ -63,20 +75,16 @@ class GetFutureEvents:
 
     def __init__(self, llm_config, tools):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model.bind_tools(tools)
+        self.llm = get_chat_model(self._llm_config, tools=tools)
 
-    async def __call__(self, state):
+    async def __call__(self, state, config):
 
         if not state.get("future_events_messages"):
             state["future_events_messages"].extend(
                 [
                     HumanMessage(content=future_state_instructions.format(
                         messages="",
-                        date=get_today_str(),
+                        date=get_run_date(config),
                         current_state_summary=state.get("current_state_summary")
                     ))
                 ]
@@ -87,7 +95,6 @@ class GetFutureEvents:
         response = await self.llm.ainvoke(
             input=messages
         )
-        print("GetFutureEvents", response)
         
         return {"future_events_messages": [response], "messages": [response]}
 
@@ -96,39 +103,63 @@ class Summarizer:
 
     def __init__(self, llm_config, node_before: Literal["current_state", "future_events"]):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model
+        self.llm = get_chat_model(self._llm_config)
         self._node_before = node_before
+        self.map_reduce = MapReduceSummarizer.from_config(self.llm, self._llm_config)
 
-    async def __call__(self, state: MacroAgentState):
+    async def __call__(self, state: MacroAgentState, config):
         """Compress research findings into a concise summary.
         
         Takes all the research messages and tool outputs and creates
         a compressed summary suitable for the supervisor's decision-making.
         """
         
-        system_message = compress_research_system_prompt.format(date=get_today_str())
+        system_message = compress_research_system_prompt.format(date=get_run_date(config))
 
         messages_key = "current_state_messages" if self._node_before == "current_state" else "future_events_messages"
-        messages = [SystemMessage(content=system_message)] + state.get(messages_key, []) + [HumanMessage(content=compress_research_human_message)]
-        response = await self.llm.ainvoke(messages)
-               
+        # Research results pre-compressed as their branch finished are merged in their compressed form
+        history = with_precompressed_content(state.get(messages_key, []))
+
         summary_key = "current_state_summary" if self._node_before == "current_state" else "future_events_summary"
-        return {
-            summary_key: str(response.content)
-        }
+        notes = research_notes(history)
+        partial = bool(state.get("partial"))
+        if partial and not notes:
+            # The time budget ran out before this phase researched anything
+            return {summary_key: mark_partial("No research was completed for this phase."), "partial": True}
+
+        try:
+            # Bounded by the deadline of the run, if any
+            summary = await until_deadline(config, self._summarize(system_message, history, notes, state, config))
+        except asyncio.TimeoutError:
+            # Out of time: hand back the research findings as they are
+            summary, partial = "\n\n".join(notes), True
+
+        update = {summary_key: mark_partial(summary) if partial else summary}
+        if partial:
+            update["partial"] = True
+        return update
+
+    async def _summarize(self, system_message, history, notes, state, config) -> str:
+        if self.map_reduce is not None and self.map_reduce.needs_map_reduce(notes):
+            # Too large for one call: compress the research results in parallel chunks, then merge
+            return await self.map_reduce.summarize(notes, research_topic=state.get("user_query", ""), date=get_run_date(config))
+
+        messages = [SystemMessage(content=system_message)] + history + [HumanMessage(content=compress_research_human_message)]
+        response = await self.llm.ainvoke(messages)
+        return str(response.content)
 
 
 class ToolNode:
     
-    def __init__(self, tools, research_tool, macro_step: Literal["current_state", "future_events"]):
+    def __init__(self, tools, research_tool, macro_step: Literal["current_state", "future_events"], artifact_store: ArtifactStore = None, precompressor: Precompressor = None, memo_threshold: float = None):
 
         self.research_tool = research_tool
+        # Similarity above which an earlier topic of the run is reused, None to always research
+        self.memo_threshold = memo_threshold
         self.tools_by_name = {tool.name: tool for tool in tools}
         self._macro_step = macro_step
+        self.artifact_store = artifact_store or default_artifact_store
+        self.precompressor = precompressor
 
     async def __call__(self, state, config):
         """Execute supervisor decisions - either conduct research or end the process.
@@ -151,6 +182,7 @@ class ToolNode:
         
         # Initialize variables for single return pattern
         tool_messages = []
+        partial = False
 
         try:
 
@@ -191,53 +223,108 @@ class ToolNode:
                         )
                     ])
 
+                # Out of time for new research: answer the calls without launching them
+                if conduct_research_calls and out_of_time(config, AGENT_SUMMARIES):
+                    tool_messages.extend(research_message(tool_call, RESEARCH_SKIPPED) for tool_call in conduct_research_calls)
+                    partial = True
+
                 # Handle ConductResearch calls (asynchronous)
-                if conduct_research_calls:
-                    # Launch parallel research agents
-                    coros = [
-                        self.research_tool.ainvoke(input={
-                            "messages": [
-                                HumanMessage(content=tool_call["args"]["research_topic"])
-                            ],
-                            "research_topic": tool_call["args"]["research_topic"]
-                        },
-                        config=config) 
-                        for tool_call in conduct_research_calls
-                    ]
-
-                    # Wait for all research to complete
-                    tool_results = await asyncio.gather(*coros)
-                    # tool_results = [{"research_summary": "US economy is fine"} for t in conduct_research_calls]
-
-                    # Format research results as tool messages
-                    # Each sub-agent returns compressed research findings in result["compressed_research"]
-                    # We write this compressed research as the content of a ToolMessage, which allows
-                    # the supervisor to later retrieve these findings via get_notes_from_tool_calls()
-                    research_tool_messages = []
-                    for result, tool_call in zip(tool_results, conduct_research_calls):
-                        result_summary = result.get("research_summary", "Error synthesizing research report")
-                        import os
-                        if not os.path.isdir(f"data/{tool_call["id"]}"):
-                            os.makedirs(f"data/{tool_call["id"]}")
-                        with open(f"data/{tool_call["id"]}/summary.md", "w") as f:
-                            f.write(result_summary)
-                        research_tool_messages.append(
-                            ToolMessage(
-                            content=result_summary,
-                            name=tool_call["name"],
-                            tool_call_id=tool_call["id"]
-                        ))
-                    
+                elif conduct_research_calls:
+                    # Launch parallel research agents and handle each one as soon as it finishes:
+                    # its summary is persisted, streamed and pre-compressed while the others still run.
+                    # Each sub-agent returns compressed research findings in result["research_summary"],
+                    # written as the content of a ToolMessage for the planner and the summarizer
+                    research_tool_messages = await run_in_completion_order(
+                        conduct_research_calls,
+                        lambda tool_call: self._research(tool_call, config),
+                        lambda tool_call, outcome: self._on_research_complete(tool_call, outcome, config)
+                    )
                     tool_messages.extend(research_tool_messages)
+                    # Branches were cut by the deadline, and no further research can start
+                    partial = out_of_time(config, AGENT_SUMMARIES)
 
-            return {'messages': tool_messages, messages_key: tool_messages}
+            update = {'messages': tool_messages, messages_key: tool_messages}
+            if partial:
+                update["partial"] = True
+            return update
                     
         except Exception as e:
             print(f"Error in supervisor tools: {e}")
 
+    async def _research(self, tool_call, config):
+        """Run one ConductResearch call, returning its result, duration and reused topic; failures become an error summary."""
+        research_topic = tool_call["args"]["research_topic"]
+        emit(ResearchLaunched(phase=self._macro_step, tool_call_id=tool_call["id"], research_topic=research_topic, branch_path=list(get_branch_path(config)[1:])))
+        start = time.perf_counter()
+
+        async def launch():
+            # One research lead agent slot of the process-wide budget, shared fairly with sibling branches
+            async with concurrency_budget.slot("research_leads", get_branch_path(config), tool_call["id"]):
+                return await self.research_tool.ainvoke(
+                    input={
+                        "messages": [HumanMessage(content=research_topic)],
+                        "research_topic": research_topic
+                    },
+                    config=with_branch(config, tool_call["id"])
+                )
+
+        def run():
+            # Cancelled, queued or running, once only the time of the phase summary is left. The lead
+            # agent stops its research before and gets CANCEL_GRACE to return its partial summary
+            return until_deadline(config, launch(), MACRO_SUMMARIES - CANCEL_GRACE)
+
+        reused_from = None
+        try:
+            memo = get_research_memo(config)
+            if self.memo_threshold is None or memo is None:
+                result = await run()
+            else:
+                # Each phase has its own scope: a future-events topic never reuses a current-state summary
+                result, reused_from = await memo.research(f"macro:{self._macro_step}", research_topic, run, self.memo_threshold)
+        except asyncio.TimeoutError:
+            print(f"Research on '{research_topic}' cancelled at the deadline")
+            result = {"research_summary": RESEARCH_CANCELLED}
+        except Exception as e:
+            print(f"Error in research on '{research_topic}': {e}")
+            result = {"research_summary": f"Error: research failed with {type(e).__name__}: {str(e)}"}
+        return result, time.perf_counter() - start, reused_from
+
+    async def _on_research_complete(self, tool_call, outcome, config):
+        """Stream, persist and optionally pre-compress one finished research branch."""
+        result, duration, reused_from = outcome
+        research_topic = tool_call["args"]["research_topic"]
+        research_summary = result.get("research_summary", "Error synthesizing research report")
+        emit(ResearchCompleted(
+            phase=self._macro_step,
+            tool_call_id=tool_call["id"],
+            research_topic=research_topic,
+            research_summary=research_summary,
+            duration_s=duration,
+            reused_from=reused_from,
+            branch_path=list(get_branch_path(config)[1:])
+        ))
+        # Persist the summary off the event loop, grouped by run and phase
+        persist = self.artifact_store.asave(
+            run_id=get_run_id(config),
+            artifact_id=tool_call["id"],
+            content=research_summary,
+            phase=self._macro_step,
+            topic=research_topic
+        )
+        precompressed = None
+        if self.precompressor is not None:
+            precompressed, _ = await asyncio.gather(self.precompressor(research_topic, research_summary, date=get_run_date(config)), persist)
+        else:
+            await persist
+        return research_message(tool_call, research_summary, precompressed)
+
 
 def continue_current_state_search_or_pass_to_future_events_search(state: MacroAgentState):
 
+    if state.get("partial"):
+        # Out of time: summarize what exists
+        return "current_state_summarizer"
+
     last_message = state.get("current_state_messages")[-1]
 
     if isinstance(last_message, AIMessage):
@@ -251,8 +338,16 @@ def continue_current_state_search_or_pass_to_future_events_search(state: MacroAg
     return path
 
 
+def continue_to_future_events_or_summarize(state: MacroAgentState):
+    # Out of time after the current state: no future events research is started
+    return "future_events_summarizer" if state.get("partial") else "future_events"
+
+
 def continue_future_events_search_or_end(state: MacroAgentState):
 
+    if state.get("partial"):
+        return "future_events_summarizer"
+
     last_message = state.get("messages")[-1]
     if isinstance(last_message, AIMessage):
         path = "future_events_summarizer" if any(
@@ -270,9 +365,14 @@ class MacroAgent:
 
     def __init__(self, llm_config, compile_config):
         self.llm_config = llm_config
-        self.compile_config = compile_config
+        self.compile_config = with_checkpointer(compile_config, llm_config.get("checkpoint"))
         self.graph = None
         self.compiled_graph = None
+        configure_http_pools(self.llm_config.get("http"))
+        configure_rate_limits(self.llm_config.get("rate_limits"))
+        configure_hedging(self.llm_config.get("hedging"))
+        configure_metrics(self.llm_config.get("metrics"))
+        configure_concurrency(self.llm_config.get("concurrency"))
         self._research_lead_agent = ResearchLeadAgent(llm_config=self.llm_config, compile_config=self.compile_config)
         self.tools = [
             ConductResearch, ResearchComplete, think_tool
@@ -286,15 +386,17 @@ class MacroAgent:
         graph = StateGraph(MacroAgentState)
         graph.add_node("current_state", GetCurrentState(llm_config=self.llm_config.get("planner").get("current_state"), tools=self.tools))
         graph.add_node("future_events", GetFutureEvents(llm_config=self.llm_config.get("planner").get("future_events"), tools=self.tools))
-        graph.add_node("current_state_tools", ToolNode(tools=self.tools, research_tool=self._research_lead_agent, macro_step="current_state"))
-        graph.add_node("future_events_tools", ToolNode(tools=self.tools, research_tool=self._research_lead_agent, macro_step="future_events"))
+        precompressor = Precompressor.from_config(self.llm_config.get("research").get("precompress_research"))
+        threshold = memo_threshold(self.llm_config.get("research").get("memo"))
+        graph.add_node("current_state_tools", ToolNode(tools=self.tools, research_tool=self._research_lead_agent, macro_step="current_state", precompressor=precompressor, memo_threshold=threshold))
+        graph.add_node("future_events_tools", ToolNode(tools=self.tools, research_tool=self._research_lead_agent, macro_step="future_events", precompressor=precompressor, memo_threshold=threshold))
         graph.add_node("current_state_summarizer", Summarizer(llm_config=self.llm_config.get("research").get("summarize_research"), node_before="current_state"))
         graph.add_node("future_events_summarizer", Summarizer(llm_config=self.llm_config.get("research").get("summarize_research"), node_before="future_events"))
 
         graph.add_edge(START, "current_state")
         graph.add_edge("current_state", "current_state_tools")
         graph.add_conditional_edges("current_state_tools", continue_current_state_search_or_pass_to_future_events_search, {"current_state_summarizer": "current_state_summarizer", "current_state": "current_state"})
-        graph.add_edge("current_state_summarizer", "future_events")
+        graph.add_conditional_edges("current_state_summarizer", continue_to_future_events_or_summarize, {"future_events": "future_events", "future_events_summarizer": "future_events_summarizer"})
         graph.add_edge("future_events", "future_events_tools")
         graph.add_conditional_edges("future_events_tools", continue_future_events_search_or_end, {"future_events_summarizer": "future_events_summarizer", "future_events": "future_events"})
         graph.add_edge("future_events_summarizer", END)
@@ -304,9 +406,100 @@ class MacroAgent:
     def _compile_graph(self):
         self.compiled_graph = self.graph.compile(**self.compile_config)
     
-    async def ainvoke(self, input, config):
-        return await self.compiled_graph.ainvoke(input, config=config)
+    def _run_config(self, config, time_budget=None):
+        # One run id, URL registry and deadline per run, shared by every nested research agent
+        return instrument(with_run_context(with_deadline(config, self.llm_config.get("deadline"), time_budget)))
+
+    async def ainvoke(self, input, config, time_budget=None):
+        """Run the graph on input.
+
+        Args:
+            input: Graph input
+            config: LangGraph config of the run
+            time_budget: Seconds the run may take, overriding deadline.time_budget of config/llm.yaml.
+                Past it no research starts, running research is cut, and the summaries,
+                marked partial (state["partial"]), are written from what was found.
+
+        Returns:
+            The final state
+        """
+        await model_registry.prewarm_once()
+        config = self._run_config(config, time_budget)
+        # Its artifacts are not evicted by concurrent runs while it is in progress
+        with live_run(config):
+            return await self.compiled_graph.ainvoke(input, config=config)
     
+    async def aresume(self, run_id, config=None, time_budget=None):
+        """Continue the checkpointed run run_id from its last completed step.
+
+        Needs a checkpointer (checkpoint section of config/llm.yaml, or compile_config).
+        Finished nodes, including finished nested research branches, are not run again.
+        The resumed run gets a time budget of its own.
+        """
+        await model_registry.prewarm_once()
+        config = self._run_config(resume_config(run_id, config), time_budget)
+        with live_run(config):
+            return await self.compiled_graph.ainvoke(None, config=config)
+
+    async def astream(self, input, config=None, time_budget=None):
+        """Run the graph, yielding typed events as they happen.
+
+        Events come in run order: planner decisions, research launched and
+        completed, the current-state summary as soon as it is written, then the
+        future-events ones, and a final RunCompleted carrying the final state.
+        Research launched and completed by the nested research lead agents is
+        streamed too, with the planner's tool call id in its branch_path.
+
+        Args:
+            input: Graph input, as for ainvoke
+            config: LangGraph config of the run
+            time_budget: Seconds the run may take, as for ainvoke
+
+        Yields:
+            MacroEvent instances
+        """
+        await model_registry.prewarm_once()
+        state = {}
+        config = self._run_config(config, time_budget)
+        with live_run(config):
+            # subgraphs=True forwards the events emitted inside the nested research lead agents
+            stream = self.compiled_graph.astream(input, config=config, stream_mode=["updates", "custom", "values"], subgraphs=True)
+            async for namespace, mode, chunk in stream:
+                if mode == "custom":
+                    if isinstance(chunk, MacroEvent):
+                        yield chunk
+                elif namespace:
+                    # Node updates and states of the nested graphs are not events of the run
+                    continue
+                elif mode == "values":
+                    state = chunk
+                else:
+                    for node, update in chunk.items():
+                        event = _event_from_update(node, update)
+                        if event is not None:
+                            yield event
+        yield RunCompleted(state=state)
+
     async def __call__(self, input, config):
         return await self.ainvoke(input, config)
+
+
+def _event_from_update(node, update):
+    """Translate a node update of the MacroAgent graph into a stream event, if it is one."""
+    if not update:
+        return None
+    if node in ("current_state", "future_events"):
+        response = update[f"{node}_messages"][-1]
+        usage = response.usage_metadata or {}
+        return PlannerDecision(
+            phase=node,
+            content=str(response.content),
+            tool_calls=[{"name": tool_call["name"], "args": tool_call["args"], "id": tool_call["id"]} for tool_call in response.tool_calls],
+            input_tokens=usage.get("input_tokens", 0),
+            cached_tokens=(usage.get("input_token_details") or {}).get("cache_read", 0)
+        )
+    if node in ("current_state_summarizer", "future_events_summarizer"):
+        phase = node.removesuffix("_summarizer")
+        return PhaseSummary(phase=phase, summary=update[f"{phase}_summary"], partial=bool(update.get("partial")))
+    return None
     
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""Run MacroAgent over a JSONL file of queries.
+
+Each input line is a JSON object with a "query" and an optional "id" (by
+default a hash of the query). Queries run concurrently under a global budget,
+all through one compiled graph and the process-wide model and HTTP pools, and
+each result is appended to the output JSONL as soon as it completes. Running the
+same command again skips the ids already answered successfully, so an
+interrupted batch resumes where it stopped; with checkpointing enabled
+(checkpoint section of config/llm.yaml), interrupted queries also continue
+from their last checkpoint instead of starting over. Checkpoints are keyed by
+query id and batch id (today's date by default), so a batch run on another
+day researches every query afresh instead of returning earlier results.
+
+Usage (from the repository root):
+
+    python src/batch.py queries.jsonl --output results.jsonl --max-concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Iterable, List, Optional
+
+from sys import path
+
+path.append("../src/")
+from tools.cache import content_key
+from tools.checkpoint import get_run_status, resume_config
+
+
+def read_queries(input_path: str) -> List[dict]:
+    """Read the queries of a JSONL file, giving each one an id.
+
+    Args:
+        input_path: JSONL file with one {"query": ..., "id": ...} object per line
+
+    Returns:
+        Queries in file order, duplicated ids removed
+    """
+    queries = {}
+    with open(input_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            query_id = str(item.get("id") or content_key(item["query"])[:16])
+            queries.setdefault(query_id, {**item, "id": query_id})
+    return list(queries.values())
+
+
+def completed_ids(output_path: str) -> set:
+    """Ids already answered successfully in an output JSONL file."""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash, the query is run again
+                continue
+            if result.get("status") == "ok":
+                done.add(result["id"])
+    return done
+
+
+class ResultWriter:
+    """Append results to a JSONL file, one line per result, flushed as they arrive."""
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self._lock = asyncio.Lock()
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        # A crash may have cut the last line short, start on a fresh line
+        self._needs_newline = False
+        if os.path.exists(output_path) and os.path.getsize(output_path):
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                self._needs_newline = f.read(1) != b"\n"
+
+    def _append(self, line: str) -> None:
+        if self._needs_newline:
+            line = "\n" + line
+            self._needs_newline = False
+        with open(self.output_path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def write(self, result: dict) -> None:
+        line = json.dumps(result, ensure_ascii=False) + "\n"
+        async with self._lock:
+            await asyncio.to_thread(self._append, line)
+
+
+def batch_run_id(query_id: str, batch_id: str) -> str:
+    """Run id, and checkpoint thread id, of a query within a batch."""
+    return f"{query_id}:{batch_id}"
+
+
+async def run_batch(
+    agent,
+    queries: Iterable[dict],
+    output_path: str,
+    max_concurrency: int = 8,
+    config: Optional[dict] = None,
+    batch_id: Optional[str] = None,
+) -> dict:
+    """Run agent on every query not yet answered in output_path.
+
+    Args:
+        agent: MacroAgent whose compiled graph is shared by every query
+        queries: Queries with their ids, as returned by read_queries
+        output_path: JSONL file the results are appended to
+        max_concurrency: Maximum number of queries in flight
+        config: Base LangGraph config of every run
+        batch_id: Salt of the run ids, today's date when None; checkpoints of
+            the same query are only resumed or reused within one batch id
+
+    Returns:
+        Counts of succeeded, failed and skipped queries
+    """
+    batch_id = batch_id or time.strftime("%Y-%m-%d")
+    done = completed_ids(output_path)
+    queries = list(queries)
+    pending = [query for query in queries if query["id"] not in done]
+    counts = {"ok": 0, "error": 0, "skipped": len(queries) - len(pending)}
+    writer = ResultWriter(output_path)
+
+    queue = asyncio.Queue()
+    for query in pending:
+        queue.put_nowait(query)
+
+    async def run_one(query: dict) -> dict:
+        start = time.perf_counter()
+        result = {"id": query["id"], "query": query["query"]}
+        try:
+            # With checkpointing, a query interrupted earlier in the same batch continues where it stopped,
+            # and one that completed without its result being written is read back from its checkpoint
+            run_id = batch_run_id(query["id"], batch_id)
+            status = await get_run_status(agent.compiled_graph, run_id)
+            if status == "interrupted":
+                state = await agent.aresume(run_id, config)
+            elif status == "completed":
+                state = (await agent.compiled_graph.aget_state(resume_config(run_id))).values
+            else:
+                state = await agent.ainvoke(
+                    {"user_query": query["query"], "current_state_messages": [], "future_events_messages": []},
+                    config=resume_config(run_id, config)
+                )
+            result.update(
+                status="ok",
+                current_state_summary=state.get("current_state_summary"),
+                future_events_summary=state.get("future_events_summary"),
+            )
+        except Exception as e:
+            result.update(status="error", error=f"{type(e).__name__}: {str(e)}")
+        result["duration_s"] = time.perf_counter() - start
+        return result
+
+    async def worker():
+        while True:
+            try:
+                query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await run_one(query)
+            await writer.write(result)
+            counts[result["status"]] += 1
+            print(f"[{counts['ok'] + counts['error']}/{len(pending)}] {result['id']} {result['status']} in {result['duration_s']:.1f}s")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(max_concurrency, len(pending))))))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("--output", required=True, help="JSONL file the results are appended to")
+    parser.add_argument("--config", default="config/llm.yaml")
+    parser.add_argument("--max-concurrency", type=int, help="Queries in flight (default: batch.max_concurrency of the config)")
+    parser.add_argument("--batch-id", help="Batch whose checkpoints are resumed (default: today's date)")
+    args = parser.parse_args()
+
+    import yaml
+    from app import MacroAgent
+
+    llm_config = yaml.safe_load(open(args.config, "rb"))
+    max_concurrency = args.max_concurrency or llm_config.get("batch", {}).get("max_concurrency", 8)
+    agent = MacroAgent(llm_config=llm_config, compile_config={})
+    counts = asyncio.run(run_batch(agent, read_queries(args.input), args.output, max_concurrency=max_concurrency, batch_id=args.batch_id))
+    print(f"Done: {counts['ok']} succeeded, {counts['error']} failed, {counts['skipped']} already completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -35,8 +35,10 @@ You have access to three main tools:
 - Do I have enough to answer the question comprehensively?
 - Should I search more or provide my answer?
 </Show Your Thinking>
+"""
 
-List of messages you have made:
+# Sent after current_state_instructions, so the instructions stay a stable prompt prefix
+current_state_transcript_prompt = """List of messages you have made:
 <Messages>{messages}</Messages>
 """
 
@@ -264,6 +266,34 @@ Remember, your goal is to create a summary that can be easily understood and uti
 Today's date is {date}.
 """
 
+merge_webpage_summaries_prompt = """You are given the summaries of consecutive parts of one long webpage or document retrieved from a web search. Each part was summarized on its own because the document is too long to be read at once. Your goal is to merge them into a single summary of the whole document, to be used by a downstream research agent.
+
+Here are the summaries of the parts, in document order:
+
+<part_summaries>
+{part_summaries}
+</part_summaries>
+
+Please follow these guidelines to merge them:
+
+1. Identify the main topic or purpose of the whole document.
+2. Keep every key fact, statistic, data point, date and name, even if it appears in a single part.
+3. Remove repetitions between parts, keeping the most precise version of each statement.
+4. Keep the order of the document when it matters (chronology, sections of a report).
+5. Select the most important quotes and excerpts of the whole document, up to a maximum of 5.
+
+Present your summary in the following format:
+
+```
+{{
+   "summary": "Your merged summary here, structured with appropriate paragraphs or bullet points as needed",
+   "key_excerpts": "First important quote or excerpt, Second important quote or excerpt, ...Add more excerpts as needed, up to a maximum of 5"
+}}
+```
+
+Today's date is {date}.
+"""
+
 # Research agent prompt for MCP (Model Context Protocol) file access
 research_agent_prompt_with_mcp = """You are a research assistant conducting research on the user's input topic using local files. For context, today's date is {date}.
 
@@ -1,6 +1,5 @@
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langchain_core.messages import SystemMessage, HumanMessage, filter_messages, ToolMessage
-from langchain.chat_models import init_chat_model
 
 import operator
 from typing import Annotated, Literal, List
@@ -10,10 +9,16 @@ import asyncio
 from sys import path
 
 path.append("../src/")
+from tools.models import get_chat_model
 from prompts import compress_research_system_prompt, research_agent_prompt, compress_research_human_message
-from tools.others import get_today_str
-from tools.search import tavily_search
+from tools.search import tavily_search, configure_page_summaries
 from tools.think import think_tool
+from tools.registry import with_run_context, get_run_date
+from tools.metrics import instrument
+from tools.checkpoint import resume_config
+from tools.context import ContextCompactor, count_tokens
+from tools.executor import ToolExecutor
+from tools.deadline import out_of_time, until_deadline, LEAD_SUMMARIES, AGENT_SUMMARIES, TOOL_SKIPPED
 
 
 # graph state
@@ -32,25 +37,35 @@ class ResearchSummary(BaseModel):
 class LLMCall:
     def __init__(self, llm_config, tools):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
+        self.llm_with_tools = get_chat_model(self._llm_config, tools=tools)
+        # Token budget of the message history sent on each turn
+        self.context = ContextCompactor(
+            max_tokens=self._llm_config.get("max_context_tokens", 12000),
+            model_name=self._llm_config.get("model_name"),
         )
-        self.llm_with_tools = model.bind_tools(tools)
 
-    async def __call__(self, state: ResearchAgentState):
+    async def __call__(self, state: ResearchAgentState, config):
         """Analyze current state and decide on next actions.
         
         The model analyzes the current conversation state and decides whether to:
         1. Call search tools to gather more information
         2. Provide a final answer based on gathered information
         
+        Older tool outputs are folded into compact notes once the history passes
+        the token budget, so the prompt does not grow with every turn.
+        
         Returns updated state with the model's response.
         """
+        # The date pinned for the run keeps the system prompt identical across turns
+        system_message = research_agent_prompt.format(date=get_run_date(config))
+        messages = self.context.compact(
+            state["messages"],
+            reserved_tokens=count_tokens(system_message, self.context.model_name)
+        )
         return {
             "messages": [
                 await self.llm_with_tools.ainvoke(
-                    [SystemMessage(content=research_agent_prompt)] + state["messages"]
+                    [SystemMessage(content=system_message)] + messages
                 )
             ]
         }
@@ -59,22 +74,17 @@ class LLMCall:
 class SummarizeResearch:
     def __init__(self, llm_config):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model
+        self.llm = get_chat_model(self._llm_config)
 
-    async def __call__(self, state: ResearchAgentState):
+    async def __call__(self, state: ResearchAgentState, config):
         """Compress research findings into a concise summary.
         
         Takes all the research messages and tool outputs and creates
         a compressed summary suitable for the supervisor's decision-making.
         """
         
-        system_message = compress_research_system_prompt.format(date=get_today_str())
+        system_message = compress_research_system_prompt.format(date=get_run_date(config))
         messages = [SystemMessage(content=system_message)] + state.get("messages", []) + [HumanMessage(content=compress_research_human_message)]
-        response = await self.llm.ainvoke(messages)
         
         # Extract raw notes from tool and AI messages
         raw_notes = [
@@ -83,51 +93,44 @@ class SummarizeResearch:
                 include_types=["tool", "ai"]
             )
         ]
+
+        try:
+            # Done before the time of the lead and phase summaries, if the run has a deadline
+            response = await until_deadline(config, self.llm.ainvoke(messages), LEAD_SUMMARIES)
+            research_summary = str(response.content)
+        except asyncio.TimeoutError:
+            # Out of time: hand back the raw findings
+            research_summary = "\n".join(raw_notes)
         
         return {
-            "research_summary": str(response.content),
+            "research_summary": research_summary,
             "raw_notes": ["\n".join(raw_notes)]
         }
 
 
 class ToolNode:
-    def __init__(self, tools):
-        # Set up tools
-        self.tools_by_name = {tool.name: tool for tool in tools}
+    def __init__(self, tools, tool_limits=None):
+        # Set up tools, run through one executor holding the per-tool limits
+        self.executor = ToolExecutor(tools, limits=tool_limits)
 
 
-    async def __call__(self, state: ResearchAgentState):
+    async def __call__(self, state: ResearchAgentState, config):
         """Execute all tool calls from the previous LLM response.
         
-        Executes all tool calls from the previous LLM responses.
+        Executes all tool calls from the previous LLM responses once each, concurrently.
         Returns updated state with tool execution results.
         """
         tool_calls = state["messages"][-1].tool_calls
-    
-        # Execute all tool calls
-        observations = []
-        for tool_call in tool_calls:
-            tool = self.tools_by_name[tool_call["name"]]
-            observations.append(
-                await tool.ainvoke(tool_call["args"])
-            )
-        # Launch parallel research agents
-        coros = [
-            self.tools_by_name[tool_call["name"]].ainvoke(tool_call["args"]) 
-            for tool_call in tool_calls
-        ]
 
-        # Wait for all research to complete
-        observations = await asyncio.gather(*coros)
-                
-        # Create tool message outputs
-        tool_outputs = [
-            ToolMessage(
-                content=observation,
-                name=tool_call["name"],
-                tool_call_id=tool_call["id"]
-            ) for observation, tool_call in zip(observations, tool_calls)
-        ]
+        if out_of_time(config, AGENT_SUMMARIES):
+            # No new search once the deadline of the run is near, the calls still get an answer
+            return {"messages": [
+                ToolMessage(content=TOOL_SKIPPED, name=tool_call["name"], tool_call_id=tool_call["id"], status="error")
+                for tool_call in tool_calls
+            ]}
+
+        # Failures and timeouts come back as error ToolMessages
+        tool_outputs = await self.executor.aexecute(tool_calls, config=config)
         
         return {"messages": tool_outputs}
 
@@ -148,11 +151,17 @@ def route_research(state: ResearchAgentState) -> Literal["tool_node", "summarize
     return path
 
 
+def continue_research(state: ResearchAgentState, config) -> Literal["llm_call", "summarize_research"]:
+    # Near the deadline of the run, summarize the findings instead of asking for more searches
+    return "summarize_research" if out_of_time(config, AGENT_SUMMARIES) else "llm_call"
+
+
 class ResearchAgent:
     def __init__(self, llm_config, compile_config = {}):
         self.llm_config = llm_config
         self.graph = None
         self.compiled_graph = None
+        configure_page_summaries(self.llm_config.get("summarize_webpage"))
 
         self._build_graph()
         self._compile_graph(compile_config)
@@ -164,12 +173,12 @@ class ResearchAgent:
         graph = StateGraph(ResearchAgentState)
 
         graph.add_node("llm_call", LLMCall(llm_config=self.llm_config.get("research_agent"), tools=tools))
-        graph.add_node("tool_node", ToolNode(tools=tools))
+        graph.add_node("tool_node", ToolNode(tools=tools, tool_limits=self.llm_config.get("research_agent").get("tools")))
         graph.add_node("summarize_research", SummarizeResearch(llm_config=self.llm_config.get("summarize_research")))
 
         graph.add_edge(START, "llm_call")
         graph.add_conditional_edges("llm_call", route_research, {"tool_node": "tool_node", "summarize_research": "summarize_research"})
-        graph.add_edge("tool_node", "llm_call")
+        graph.add_conditional_edges("tool_node", continue_research, {"llm_call": "llm_call", "summarize_research": "summarize_research"})
         graph.add_edge("summarize_research", END)
 
         self.graph = graph
@@ -178,8 +187,16 @@ class ResearchAgent:
         self.compiled_graph = self.graph.compile(**compile_config)
     
     async def ainvoke(self, input, config = {}):
-        return await self.compiled_graph.ainvoke(input, config=config)
+        return await self.compiled_graph.ainvoke(input, config=instrument(with_run_context(config)))
     
+    async def aresume(self, run_id, config=None):
+        """Continue the checkpointed run run_id from its last completed step.
+
+        Needs a checkpointer (checkpoint section of config/llm.yaml, or compile_config).
+        Finished nodes, including finished nested research branches, are not run again.
+        """
+        return await self.compiled_graph.ainvoke(None, config=instrument(with_run_context(resume_config(run_id, config))))
+
     async def __call__(self, input, config):
         return await self.ainvoke(input, config)
     
\ No newline at end of file
@@ -1,9 +1,11 @@
 import asyncio
+import sys
+import time
 
 from typing_extensions import Literal
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import (
+    AIMessage,
     HumanMessage, 
     BaseMessage, 
     SystemMessage, 
@@ -14,14 +16,24 @@ from langgraph.graph import StateGraph, START, END, MessagesState
 from langgraph.types import Command
 from sys import path
 path.append("../src/")
+from tools.models import get_chat_model, configure_http_pools
+from tools.limits import configure_rate_limits
+from tools.hedging import configure_hedging
+from tools.metrics import configure_metrics, instrument
+from tools.checkpoint import with_checkpointer, resume_config
 from prompts import lead_researcher_prompt, compress_research_system_prompt, compress_research_human_message
 
 from tools.supervise import (
     ConductResearch, 
     ResearchComplete
 )
-from tools.others import get_today_str
 from tools.think import think_tool
+from tools.registry import with_run_context, with_branch, get_run_date, get_research_memo, get_branch_path
+from tools.scheduler import configure_concurrency, concurrency_budget
+from tools.deadline import with_deadline, out_of_time, until_deadline, mark_partial, MACRO_SUMMARIES, LEAD_SUMMARIES, AGENT_SUMMARIES, CANCEL_GRACE, RESEARCH_CANCELLED
+from tools.memo import memo_threshold
+from tools.fanout import Precompressor, run_in_completion_order, research_message, with_precompressed_content
+from tools.events import ResearchLaunched, ResearchCompleted, emit
 import operator
 from typing_extensions import Annotated
 
@@ -46,6 +58,8 @@ class ResearchLeadAgentState(MessagesState):
     raw_notes: Annotated[list[str], operator.add] = []
     # research summary
     research_summary: str
+    # Set once the time budget of the run stopped the research: the summary is then partial
+    partial: bool
 
 
 def get_notes_from_tool_calls(messages: list[BaseMessage]) -> list[str]:
@@ -63,35 +77,33 @@ def get_notes_from_tool_calls(messages: list[BaseMessage]) -> list[str]:
     Returns:
         List of research note strings extracted from ToolMessage objects
     """
-    return [tool_msg.content for tool_msg in filter_messages(messages, include_types="tool")]
+    # Findings pre-compressed when their branch finished are used in their compressed form
+    return [tool_msg.content for tool_msg in with_precompressed_content(filter_messages(messages, include_types="tool"))]
 
 
 # Ensure async compatibility for Jupyter environments
-try:
-    import nest_asyncio
-    # Only apply if running in Jupyter/IPython environment
+# IPython is only probed when already loaded, importing it is slow and never needed outside Jupyter
+if "IPython" in sys.modules:
     try:
+        import nest_asyncio
         from IPython import get_ipython
         if get_ipython() is not None:
             nest_asyncio.apply()
     except ImportError:
-        pass  # Not in Jupyter, no need for nest_asyncio
-except ImportError:
-    pass  # nest_asyncio not available, proceed without it
+        pass  # nest_asyncio not available, proceed without it
 
 
 class LLMCall:
-    def __init__(self, llm_config, tools):
-        llm = init_chat_model(model="gpt-4o-mini", temperature=0)
-        self.llm_with_tools = llm.bind_tools(tools)
+    def __init__(self, llm_config, tools, max_concurrent_researchers: int = 3):
+        self.llm_with_tools = get_chat_model(llm_config, tools=tools)
         # Maximum number of concurrent research agents the supervisor can launch
-        # This is passed to the lead_researcher_prompt to limit parallel research tasks
-        self.max_concurrent_researchers = 3
+        # This is passed to the lead_researcher_prompt, and enforced by the concurrency budget
+        self.max_concurrent_researchers = max_concurrent_researchers
         # Maximum number of tool call iterations for individual researcher agents
         # This prevents infinite loops and controls research depth per topic
         self.max_researcher_iterations = 6 # Calls to think_tool + ConductResearch
 
-    async def __call__(self, state: ResearchLeadAgentState) -> Command[Literal["tool_node"]]:
+    async def __call__(self, state: ResearchLeadAgentState, config) -> Command[Literal["tool_node", "summarizer"]]:
         """Coordinate research activities.
         
         Analyzes the research brief and current progress to decide:
@@ -103,13 +115,21 @@ class LLMCall:
             state: Current supervisor state with messages and research progress
             
         Returns:
-            Command to proceed to tool_node node with updated state
+            Command to proceed to tool_node node with updated state, or to the
+            summarizer when no research can start before the deadline of the run
         """
         messages = state.get("messages", [])
+
+        if out_of_time(config, AGENT_SUMMARIES):
+            return Command(
+                goto="summarizer",
+                update={"notes": get_notes_from_tool_calls(messages), "partial": True}
+            )
         
-        # Prepare system message with current date and constraints
+        # Prepare system message with the run date and constraints, identical on every
+        # iteration so the provider prompt cache covers it and the history before the new turn
         system_message = lead_researcher_prompt.format(
-            date=get_today_str(), 
+            date=get_run_date(config), 
             max_concurrent_research_units=self.max_concurrent_researchers,
             max_researcher_iterations=self.max_researcher_iterations
         )
@@ -128,9 +148,12 @@ class LLMCall:
 
 
 class ToolNode:
-    def __init__(self, tools, research_tool):
+    def __init__(self, tools, research_tool, precompressor: Precompressor = None, memo_threshold: float = None):
 
         self.research_tool = research_tool
+        self.precompressor = precompressor
+        # Similarity above which an earlier topic of the run is reused, None to always research
+        self.memo_threshold = memo_threshold
         # Set up tools
         self.tools_by_name = {tool.name: tool for tool in tools}
 
@@ -162,6 +185,7 @@ class ToolNode:
         all_raw_notes = []
         next_step = "supervisor"  # Default next step
         should_end = False
+        partial = False
         
         # Check exit criteria first
         exceeded_iterations = research_iterations >= self.max_researcher_iterations
@@ -202,39 +226,26 @@ class ToolNode:
 
                 # Handle ConductResearch calls (asynchronous)
                 if conduct_research_calls:
-                    # Launch parallel research agents
-                    coros = [
-                        self.research_tool.ainvoke(input={
-                            "messages": [
-                                HumanMessage(content=tool_call["args"]["research_topic"])
-                            ],
-                            "research_topic": tool_call["args"]["research_topic"]
-                        }, config=config) 
-                        for tool_call in conduct_research_calls
-                    ]
-
-                    # Wait for all research to complete
-                    tool_results = await asyncio.gather(*coros)
-
-                    # Format research results as tool messages
-                    # Each sub-agent returns compressed research findings in result["compressed_research"]
+                    # Launch parallel research agents and handle each one as soon as it finishes,
+                    # so only the slowest branch is left to wait for.
+                    # Each sub-agent returns compressed research findings in result["research_summary"]
                     # We write this compressed research as the content of a ToolMessage, which allows
                     # the supervisor to later retrieve these findings via get_notes_from_tool_calls()
-                    research_tool_messages = [
-                        ToolMessage(
-                            content=result.get("research_summary", "Error synthesizing research report"),
-                            name=tool_call["name"],
-                            tool_call_id=tool_call["id"]
-                        ) for result, tool_call in zip(tool_results, conduct_research_calls)
-                    ]
-                    
-                    tool_messages.extend(research_tool_messages)
+                    completed = await run_in_completion_order(
+                        conduct_research_calls,
+                        lambda tool_call: self._research(tool_call, config),
+                        lambda tool_call, outcome: self._on_research_complete(tool_call, outcome, config)
+                    )
+                    tool_messages.extend(tool_message for tool_message, _ in completed)
 
                     # Aggregate raw notes from all research
-                    all_raw_notes = [
-                        "\n".join(result.get("raw_notes", [])) 
-                        for result in tool_results
-                    ]
+                    all_raw_notes = [raw_notes for _, raw_notes in completed]
+
+                # No further research can finish before the deadline: summarize what exists
+                if out_of_time(config, AGENT_SUMMARIES):
+                    should_end = True
+                    next_step = "summarizer"
+                    partial = True
                     
             except Exception as e:
                 print(f"Error in supervisor tools: {e}")
@@ -243,12 +254,16 @@ class ToolNode:
         
         # Single return point with appropriate state updates
         if should_end:
+            update = {
+                # Findings of this step included, when it ran research before ending
+                "notes": get_notes_from_tool_calls(messages + tool_messages),
+                "messages": tool_messages
+            }
+            if partial:
+                update["partial"] = True
             return Command(
                 goto=next_step,
-                update={
-                    "notes": get_notes_from_tool_calls(messages),
-                    "messages": tool_messages
-                }
+                update=update
             )
         else:
             return Command(
@@ -259,31 +274,94 @@ class ToolNode:
                 }
             )
 
+    async def _research(self, tool_call, config):
+        """Run one ConductResearch call, returning its result, duration and reused topic; failures become an error summary."""
+        research_topic = tool_call["args"]["research_topic"]
+        # Below the run id, the branch path holds the planner's tool call this lead agent serves
+        emit(ResearchLaunched(tool_call_id=tool_call["id"], research_topic=research_topic, branch_path=list(get_branch_path(config)[1:])))
+        start = time.perf_counter()
+
+        async def launch():
+            # Research agents beyond the budget of the process or of this branch queue here
+            async with concurrency_budget.slot("research_agents", get_branch_path(config), tool_call["id"]):
+                return await self.research_tool.ainvoke(input={
+                    "messages": [
+                        HumanMessage(content=research_topic)
+                    ],
+                    "research_topic": research_topic
+                }, config=with_branch(config, tool_call["id"]))
+
+        def run():
+            # Cancelled once only the time of this agent's summary and the phase summary is left,
+            # plus CANCEL_GRACE for the research agent to return its partial summary
+            return until_deadline(config, launch(), LEAD_SUMMARIES - CANCEL_GRACE)
+
+        reused_from = None
+        try:
+            memo = get_research_memo(config)
+            if self.memo_threshold is None or memo is None:
+                result = await run()
+            else:
+                # Shared by every lead agent of the run, a near-duplicate topic reuses the earlier findings
+                result, reused_from = await memo.research("research", research_topic, run, self.memo_threshold)
+        except asyncio.TimeoutError:
+            print(f"Research on '{research_topic}' cancelled at the deadline")
+            result = {"research_summary": RESEARCH_CANCELLED}
+        except Exception as e:
+            # One failed branch must not cancel its siblings and drop their findings
+            print(f"Error in research on '{research_topic}': {e}")
+            result = {"research_summary": f"Error: research failed with {type(e).__name__}: {str(e)}"}
+        return result, time.perf_counter() - start, reused_from
+
+    async def _on_research_complete(self, tool_call, outcome, config):
+        """Stream and optionally pre-compress one finished research branch."""
+        result, duration, reused_from = outcome
+        research_topic = tool_call["args"]["research_topic"]
+        research_summary = result.get("research_summary", "Error synthesizing research report")
+        emit(ResearchCompleted(
+            tool_call_id=tool_call["id"],
+            research_topic=research_topic,
+            research_summary=research_summary,
+            duration_s=duration,
+            reused_from=reused_from,
+            branch_path=list(get_branch_path(config)[1:])
+        ))
+        precompressed = None
+        if self.precompressor is not None:
+            precompressed = await self.precompressor(research_topic, research_summary, date=get_run_date(config))
+        return research_message(tool_call, research_summary, precompressed), "\n".join(result.get("raw_notes", []))
+
 
 class SummarizeResearch:
     def __init__(self, llm_config):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model
+        self.llm = get_chat_model(self._llm_config)
 
-    async def __call__(self, state: ResearchLeadAgentState):
+    async def __call__(self, state: ResearchLeadAgentState, config):
         """Compress research findings into a concise summary.
         
         Takes all the research messages and tool outputs and creates
         a compressed summary suitable for the supervisor's decision-making.
         """
         
-        system_message = compress_research_system_prompt.format(date=get_today_str())
+        system_message = compress_research_system_prompt.format(date=get_run_date(config))
         messages = [SystemMessage(content=system_message)] + state.get("notes", []) + [HumanMessage(content=compress_research_human_message)]
-        response = await self.llm.ainvoke(messages)
+        partial = bool(state.get("partial"))
+        try:
+            # Done before the time of the phase summary, if the run has a deadline
+            response = await until_deadline(config, self.llm.ainvoke(messages), MACRO_SUMMARIES)
+        except asyncio.TimeoutError:
+            # Out of time: hand back the research findings as they are
+            response, partial = AIMessage(content="\n\n".join(state.get("notes", []))), True
+        research_summary = mark_partial(str(response.content)) if partial else str(response.content)
                 
-        return {
-            "research_summary": str(response.content),
+        update = {
+            "research_summary": research_summary,
             "messages": [response]
         }
+        if partial:
+            update["partial"] = True
+        return update
 
 
 class ResearchLeadAgent:
@@ -292,9 +370,14 @@ class ResearchLeadAgent:
         self.llm_config = llm_config
         self.graph = None
         self.compiled_graph = None
+        configure_http_pools(self.llm_config.get("http"))
+        configure_rate_limits(self.llm_config.get("rate_limits"))
+        configure_hedging(self.llm_config.get("hedging"))
+        configure_metrics(self.llm_config.get("metrics"))
+        configure_concurrency(self.llm_config.get("concurrency"))
 
         self._build_graph()
-        self._compile_graph(compile_config)
+        self._compile_graph(with_checkpointer(compile_config, self.llm_config.get("checkpoint")))
 
     def _build_graph(self):
 
@@ -307,8 +390,11 @@ class ResearchLeadAgent:
 
         graph = StateGraph(ResearchLeadAgentState)
 
-        graph.add_node("supervisor", LLMCall(llm_config=self.llm_config.get("supervisor").get("supervisor_agent"), tools=tools))
-        graph.add_node("tool_node", ToolNode(tools=tools, research_tool=research_tool))
+        max_concurrent_researchers = (self.llm_config.get("concurrency") or {}).get("max_per_branch", 3)
+        graph.add_node("supervisor", LLMCall(llm_config=self.llm_config.get("supervisor").get("supervisor_agent"), tools=tools, max_concurrent_researchers=max_concurrent_researchers))
+        precompressor = Precompressor.from_config(self.llm_config.get("research").get("precompress_research"))
+        threshold = memo_threshold(self.llm_config.get("research").get("memo"))
+        graph.add_node("tool_node", ToolNode(tools=tools, research_tool=research_tool, precompressor=precompressor, memo_threshold=threshold))
         graph.add_node("summarizer", SummarizeResearch(llm_config=self.llm_config.get("research").get("summarize_research")))
         
         graph.add_edge(START, "supervisor")
@@ -322,5 +408,14 @@ class ResearchLeadAgent:
     async def __call__(self, input, config=None):
         return await self.ainvoke(input, config)
     
-    async def ainvoke(self, input, config=None):
-        return await self.compiled_graph.ainvoke(input, config=config)
+    async def ainvoke(self, input, config=None, time_budget=None):
+        # Nested in a MacroAgent, the caller's deadline is kept
+        return await self.compiled_graph.ainvoke(input, config=instrument(with_run_context(with_deadline(config, self.llm_config.get("deadline"), time_budget))))
+
+    async def aresume(self, run_id, config=None):
+        """Continue the checkpointed run run_id from its last completed step.
+
+        Needs a checkpointer (checkpoint section of config/llm.yaml, or compile_config).
+        Finished nodes, including finished nested research branches, are not run again.
+        """
+        return await self.compiled_graph.ainvoke(None, config=instrument(with_run_context(resume_config(run_id, config))))
@@ -6,6 +6,12 @@ import operator
 
 from subagents.scope_system import TopicClarifier, ResearchBrief, check_clarity
 from subagents.research_lead_agent import ResearchLeadAgent
+from tools.registry import with_run_context
+from tools.models import configure_http_pools
+from tools.limits import configure_rate_limits
+from tools.hedging import configure_hedging
+from tools.metrics import configure_metrics, instrument
+from tools.checkpoint import with_checkpointer, resume_config
 
 
 class ResearchSystemState(MessagesState):
@@ -26,9 +32,13 @@ class ResearchSystem:
 
     def __init__(self, llm_config, compile_config):
         self.llm_config = llm_config
-        self.compile_config = compile_config
+        self.compile_config = with_checkpointer(compile_config, llm_config.get("checkpoint"))
         self.graph = None
         self.compiled_graph = None
+        configure_http_pools(self.llm_config.get("http"))
+        configure_rate_limits(self.llm_config.get("rate_limits"))
+        configure_hedging(self.llm_config.get("hedging"))
+        configure_metrics(self.llm_config.get("metrics"))
 
         self._build_graph()
         self._compile_graph()
@@ -51,7 +61,15 @@ class ResearchSystem:
         self.compiled_graph = self.graph.compile(**self.compile_config)
     
     async def ainvoke(self, input, config):
-        return await self.compiled_graph.ainvoke(input, config=config)
+        return await self.compiled_graph.ainvoke(input, config=instrument(with_run_context(config)))
+
+    async def aresume(self, run_id, config=None):
+        """Continue the checkpointed run run_id from its last completed step.
+
+        Needs a checkpointer (checkpoint section of config/llm.yaml, or compile_config).
+        Finished nodes, including finished nested research branches, are not run again.
+        """
+        return await self.compiled_graph.ainvoke(None, config=instrument(with_run_context(resume_config(run_id, config))))
 
     async def __call__(self, input, config):
         return await self.ainvoke(input, config)
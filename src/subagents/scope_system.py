@@ -1,6 +1,5 @@
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langchain_core.messages import HumanMessage, get_buffer_string, AIMessage
-from langchain.chat_models import init_chat_model
 
 from pydantic import BaseModel, Field
 import json
@@ -8,6 +7,7 @@ import json
 from sys import path
 
 path.append("../src/")
+from tools.models import get_chat_model
 from prompts import clarify_with_user_instructions, transform_messages_into_research_topic_prompt
 from tools.others import get_today_str
 
@@ -34,11 +34,7 @@ class TopicClarifier:
 
     def __init__(self, llm_config):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model.with_structured_output(TopicClarifierOutput)
+        self.llm = get_chat_model(self._llm_config, schema=TopicClarifierOutput)
 
     async def __call__(self, state):
         response = await self.llm.ainvoke(
@@ -59,11 +55,7 @@ class ResearchBrief:
 
     def __init__(self, llm_config):
         self._llm_config = llm_config
-        model = init_chat_model(
-            model=self._llm_config.get("model_name"), 
-            temperature=self._llm_config.get("temperature")
-        )
-        self.llm = model.with_structured_output(ResearchBriefOutput)
+        self.llm = get_chat_model(self._llm_config, schema=ResearchBriefOutput)
 
     async def __call__(self, state):
         response = await self.llm.ainvoke([
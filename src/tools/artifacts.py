@@ -0,0 +1,138 @@
+import asyncio
+import os
+import re
+import shutil
+import threading
+import time
+from typing import List, Optional
+
+from tools.cache import open_database
+from tools.registry import is_live_run
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+class ArtifactStore:
+    """Compressed, indexed store for research artifacts under data/.
+
+    Artifacts are grouped per run and phase and written zstd-compressed as
+    {root}/{run_id}/{phase}/{artifact_id}.md.zst. A SQLite manifest records run
+    id, phase, topic, timestamp and raw/stored sizes. After each write, whole
+    runs are evicted, oldest first, while they are older than retention_days or
+    the store is above max_bytes. The current run and every run still in
+    progress in the process (e.g. the other queries of a batch) are never evicted.
+    """
+
+    def __init__(
+        self,
+        root: str = "data/runs",
+        max_bytes: Optional[int] = 1024 * 1024 * 1024,
+        retention_days: Optional[float] = 30,
+        compression_level: int = 10,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.compression_level = compression_level
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = open_database(
+                os.path.join(self.root, "manifest.sqlite"),
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "run_id TEXT NOT NULL, artifact_id TEXT NOT NULL, phase TEXT, topic TEXT, "
+                "created_at REAL NOT NULL, raw_bytes INTEGER NOT NULL, stored_bytes INTEGER NOT NULL, path TEXT NOT NULL, "
+                "PRIMARY KEY (run_id, artifact_id))",
+                "CREATE INDEX IF NOT EXISTS artifacts_created_at ON artifacts (created_at)",
+            )
+        return self._connection
+
+    def save(self, run_id: str, artifact_id: str, content: str, phase: str = "", topic: str = "") -> str:
+        """Compress and write an artifact, record it in the manifest and apply eviction.
+
+        Args:
+            run_id: Identifier of the run the artifact belongs to
+            artifact_id: Identifier of the artifact inside the run (e.g. a tool call id)
+            content: Text content to store
+            phase: Phase of the run that produced the artifact
+            topic: Research topic of the artifact
+
+        Returns:
+            Path of the written file
+        """
+        import zstandard
+
+        raw = content.encode("utf-8")
+        compressed = zstandard.ZstdCompressor(level=self.compression_level).compress(raw)
+        directory = os.path.join(self.root, _safe_name(run_id), _safe_name(phase or "default"))
+        path = os.path.join(directory, f"{_safe_name(artifact_id)}.md.zst")
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so readers never see a partial file
+        with open(path + ".tmp", "wb") as f:
+            f.write(compressed)
+        os.replace(path + ".tmp", path)
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, artifact_id, phase, topic, time.time(), len(raw), len(compressed), path)
+            )
+            connection.commit()
+            self._evict(connection, keep_run_id=run_id)
+        return path
+
+    async def asave(self, run_id: str, artifact_id: str, content: str, phase: str = "", topic: str = "") -> str:
+        """Async version of save, compressing and writing off the event loop."""
+        return await asyncio.to_thread(self.save, run_id, artifact_id, content, phase, topic)
+
+    def load(self, run_id: str, artifact_id: str) -> Optional[str]:
+        """Return the decompressed content of an artifact, or None if unknown."""
+        import zstandard
+
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT path FROM artifacts WHERE run_id = ? AND artifact_id = ?", (run_id, artifact_id)
+            ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        with open(row[0], "rb") as f:
+            return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+
+    def manifest(self, run_id: Optional[str] = None) -> List[dict]:
+        """Return manifest entries, optionally for a single run, oldest first."""
+        query = "SELECT run_id, artifact_id, phase, topic, created_at, raw_bytes, stored_bytes, path FROM artifacts"
+        params = ()
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            params = (run_id,)
+        with self._lock:
+            rows = self._connect().execute(query + " ORDER BY created_at", params).fetchall()
+        keys = ("run_id", "artifact_id", "phase", "topic", "created_at", "raw_bytes", "stored_bytes", "path")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _evict(self, connection, keep_run_id: str) -> None:
+        runs = connection.execute(
+            "SELECT run_id, MAX(created_at), SUM(stored_bytes) FROM artifacts GROUP BY run_id ORDER BY MAX(created_at)"
+        ).fetchall()
+        total = sum(size for _, _, size in runs)
+        oldest_allowed = time.time() - self.retention_days * 86400 if self.retention_days is not None else None
+
+        for run_id, last_write, size in runs:
+            if run_id == keep_run_id or is_live_run(run_id):
+                continue
+            expired = oldest_allowed is not None and last_write < oldest_allowed
+            over_size = self.max_bytes is not None and total > self.max_bytes
+            if not (expired or over_size):
+                continue
+            connection.execute("DELETE FROM artifacts WHERE run_id = ?", (run_id,))
+            shutil.rmtree(os.path.join(self.root, _safe_name(run_id)), ignore_errors=True)
+            total -= size
+        connection.commit()
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def content_key(*parts: str) -> str:
+    """Build a content-addressed cache key from the given parts.
+
+    Args:
+        parts: Strings that fully determine the cached value
+
+    Returns:
+        Hex digest identifying the combination of parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = part.encode("utf-8")
+        # Length prefix so ("ab", "c") and ("a", "bc") do not collide
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def open_database(path: str, *schema: str) -> sqlite3.Connection:
+    """Open (creating if needed) a WAL-mode SQLite database shareable across threads.
+
+    Args:
+        path: Path of the database file
+        schema: Statements run once to create tables and indexes
+
+    Returns:
+        The open connection
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    for statement in schema:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+class SummaryCache:
+    """Persistent, size-bounded LRU cache for webpage summaries backed by SQLite.
+
+    Entries are keyed by a hash of the raw content, the summarization prompt and
+    the model name, so any change to one of them produces a fresh summary.
+    The database is opened lazily on first use.
+    """
+
+    def __init__(self, path: str = "data/cache/webpage_summaries.sqlite", max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = open_database(
+                self.path,
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access)",
+            )
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached summary for key, or None on a miss."""
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a summary and evict least recently used entries above max_bytes."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute("SELECT key, size FROM summaries ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM summaries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async version of get, run off the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        """Async version of set, run off the event loop."""
+        await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters together with the current cache size."""
+        with self._lock:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+# Seconds a search result stays fresh, per Tavily topic
+SEARCH_CACHE_TTLS = {
+    "news": 10 * 60,
+    "finance": 60 * 60,
+    "general": 24 * 60 * 60,
+}
+
+
+class SearchCache:
+    """Two-tier TTL cache for Tavily search responses.
+
+    A bounded in-memory LRU tier sits in front of a SQLite tier. Entries are
+    fresh for the TTL of their topic and may be served stale for a further
+    stale_ttl_factor * TTL seconds when stale-while-revalidate is enabled.
+    """
+
+    def __init__(
+        self,
+        path: str = "data/cache/search_results.sqlite",
+        ttls: Optional[dict] = None,
+        stale_ttl_factor: float = 1.0,
+        memory_entries: int = 512,
+    ):
+        self.path = path
+        self.ttls = {**SEARCH_CACHE_TTLS, **(ttls or {})}
+        self.stale_ttl_factor = stale_ttl_factor
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, max_results: int, topic: str, include_raw_content: bool) -> str:
+        """Build the cache key for one search request."""
+        return content_key("search", normalize_query(query), str(max_results), topic, str(bool(include_raw_content)))
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = open_database(
+                self.path,
+                "CREATE TABLE IF NOT EXISTS search_results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, topic TEXT NOT NULL, created_at REAL NOT NULL)",
+            )
+        return self._connection
+
+    def _remember(self, key: str, entry: Tuple[dict, str, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, allow_stale: bool = False) -> Tuple[Optional[dict], bool]:
+        """Look up a search response.
+
+        Args:
+            key: Cache key built with SearchCache.key
+            allow_stale: Whether to return expired entries still inside the stale window
+
+        Returns:
+            Tuple of (response or None, whether the response is fresh)
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            from_memory = entry is not None
+            if entry is None:
+                row = self._connect().execute(
+                    "SELECT value, topic, created_at FROM search_results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1], row[2])
+                    self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            value, topic, created_at = entry
+            ttl = self.ttls.get(topic, self.ttls["general"])
+            age = time.time() - created_at
+            if age <= ttl:
+                if from_memory:
+                    self.memory_hits += 1
+                else:
+                    self.disk_hits += 1
+                return value, True
+            if allow_stale and age <= ttl * (1 + self.stale_ttl_factor):
+                self.stale_hits += 1
+                return value, False
+
+            self.misses += 1
+            return None, False
+
+    def set(self, key: str, value: dict, topic: str) -> None:
+        """Store a search response in both tiers."""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, (value, topic, created_at))
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO search_results (key, value, topic, created_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), topic, created_at)
+            )
+            # Drop rows that can no longer be served, even stale
+            connection.execute(
+                "DELETE FROM search_results WHERE topic = ? AND created_at < ?",
+                (topic, created_at - self.ttls.get(topic, self.ttls["general"]) * (1 + self.stale_ttl_factor))
+            )
+            connection.commit()
+
+    async def aget(self, key: str, allow_stale: bool = False) -> Tuple[Optional[dict], bool]:
+        """Async version of get; memory hits skip the thread hop."""
+        with self._lock:
+            in_memory = key in self._memory
+        if in_memory:
+            return self.get(key, allow_stale)
+        return await asyncio.to_thread(self.get, key, allow_stale)
+
+    async def aset(self, key: str, value: dict, topic: str) -> None:
+        """Async version of set, run off the event loop."""
+        await asyncio.to_thread(self.set, key, value, topic)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters per tier."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from tools.cache import open_database
+from tools.registry import RUN_ID_KEY, THREAD_ID_KEY
+
+
+DEFAULT_CHECKPOINT_PATH = "data/checkpoints/checkpoints.sqlite"
+
+_checkpointers = {}
+_lock = threading.Lock()
+
+
+class SqliteCheckpointer(SqliteSaver):
+    """Durable LangGraph checkpointer backed by a local SQLite file.
+
+    The sync SqliteSaver does the work; the async methods used by ainvoke run
+    it in a worker thread, so one instance serves every event loop and
+    never keeps the interpreter alive at exit. Nested agents inherit the
+    checkpointer of their caller and checkpoint under its namespace, so a
+    resumed run skips the nodes, and the nested research branches, that
+    already finished.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH):
+        connection = open_database(path)
+        # Durable across process crashes, fsyncs only at WAL checkpoints
+        connection.execute("PRAGMA synchronous=NORMAL")
+        super().__init__(connection)
+        self.path = path
+
+    async def aget_tuple(self, config: RunnableConfig):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None, before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator:
+        checkpoints = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes, task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def get_checkpointer(path: str = DEFAULT_CHECKPOINT_PATH):
+    """Return the process-wide SQLite checkpointer of path, opening it on first use."""
+    with _lock:
+        if path not in _checkpointers:
+            _checkpointers[path] = SqliteCheckpointer(path)
+        return _checkpointers[path]
+
+
+def with_checkpointer(compile_config: Optional[dict], settings: Optional[dict]) -> dict:
+    """Add the durable checkpointer to a compile config when the checkpoint section enables it.
+
+    A checkpointer already present in compile_config is kept.
+
+    Args:
+        compile_config: Keyword arguments of StateGraph.compile
+        settings: checkpoint section of config/llm.yaml
+
+    Returns:
+        The compile config to use
+    """
+    compile_config = dict(compile_config or {})
+    if settings and settings.get("enabled") and compile_config.get("checkpointer") is None:
+        compile_config["checkpointer"] = get_checkpointer(settings.get("path", DEFAULT_CHECKPOINT_PATH))
+    return compile_config
+
+
+def resume_config(run_id: str, config: Optional[RunnableConfig] = None) -> RunnableConfig:
+    """Return config pointing at the checkpoints of run_id."""
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), RUN_ID_KEY: run_id, THREAD_ID_KEY: run_id}
+    return config
+
+
+async def get_run_status(compiled_graph: Any, run_id: str) -> Optional[str]:
+    """Status of the checkpointed run run_id of a compiled graph.
+
+    Returns:
+        None without checkpoint, "interrupted" when nodes remain to run, "completed" otherwise
+    """
+    if compiled_graph.checkpointer is None:
+        return None
+    snapshot = await compiled_graph.aget_state(resume_config(run_id))
+    if not snapshot.values:
+        return None
+    return "interrupted" if snapshot.next else "completed"
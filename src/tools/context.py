@@ -0,0 +1,195 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from tools.cache import content_key
+
+# Token counts kept by count_tokens, keyed by a digest of the text rather than the text itself,
+# so whole webpages and research summaries are not kept alive by the cache
+TOKEN_COUNT_ENTRIES = 4096
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model_name: str):
+    import tiktoken
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Failed to load tiktoken encoding for {model_name}, estimating tokens: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model_name: str = "gpt-4o-mini") -> int:
+    """Count the tokens of text with the tiktoken encoding of model_name.
+
+    Falls back to a 4 characters per token estimate when the encoding cannot be
+    loaded (e.g. tiktoken files are not cached and there is no network).
+
+    Args:
+        text: Text to measure
+        model_name: Model whose tokenizer is used
+
+    Returns:
+        Number of tokens of text
+    """
+    key = (content_key(text, model_name), len(text))
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+
+    encoding = _get_encoding(model_name)
+    count = len(text) // 4 + 1 if encoding is None else len(encoding.encode(text, disallowed_special=()))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        while len(_token_counts) > TOKEN_COUNT_ENTRIES:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def count_message_tokens(messages: List[BaseMessage], model_name: str = "gpt-4o-mini") -> int:
+    """Approximate the prompt tokens of a list of messages, tool call arguments included."""
+    total = 0
+    for message in messages:
+        # Per-message overhead of the chat format
+        total += 4 + count_tokens(message.text, model_name)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            total += count_tokens(str(message.tool_calls), model_name)
+    return total
+
+
+def split_by_tokens(text: str, max_tokens: int, model_name: str = "gpt-4o-mini") -> List[str]:
+    """Split text into pieces of at most max_tokens, at paragraph boundaries when possible.
+
+    Args:
+        text: Text to split
+        max_tokens: Token budget of each piece
+        model_name: Model whose tokenizer is used
+
+    Returns:
+        Pieces in order, a single one when text already fits
+    """
+    if count_tokens(text, model_name) <= max_tokens:
+        return [text]
+
+    pieces, current, current_tokens = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        tokens = count_tokens(paragraph, model_name)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        if tokens > max_tokens:
+            pieces.extend(_split_tokens(paragraph, max_tokens, model_name))
+            continue
+        current.append(paragraph)
+        # Count the paragraph separator too
+        current_tokens += tokens + 1
+    if current:
+        pieces.append("\n\n".join(current))
+    return pieces
+
+
+def _split_tokens(text: str, max_tokens: int, model_name: str) -> List[str]:
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        # Inverse of the estimate of count_tokens
+        size = max(max_tokens - 1, 1) * 4
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def pack_by_tokens(texts: List[str], max_tokens: int, model_name: str = "gpt-4o-mini") -> List[List[str]]:
+    """Group texts, in order, into batches of at most max_tokens each.
+
+    Texts over the budget are split first, so every batch fits.
+
+    Args:
+        texts: Texts to group
+        max_tokens: Token budget of each batch
+        model_name: Model whose tokenizer is used
+
+    Returns:
+        Batches of texts
+    """
+    batches, current, current_tokens = [], [], 0
+    for text in texts:
+        for piece in split_by_tokens(text, max_tokens, model_name):
+            tokens = count_tokens(piece, model_name)
+            if current and current_tokens + tokens > max_tokens:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class ContextCompactor:
+    """Keep a message history under a token budget by folding old tool outputs.
+
+    Tool messages are replaced, oldest first, by compact notes holding the start
+    of their content and the source URLs they cited. Messages stay in place so
+    every tool call keeps its matching ToolMessage, and the most recent messages
+    are never folded. Folding is deterministic, so the compacted prefix is stable
+    across turns.
+    """
+
+    def __init__(self, max_tokens: int = 12000, keep_last: int = 4, note_chars: int = 500, model_name: str = "gpt-4o-mini"):
+        self.max_tokens = max_tokens
+        self.keep_last = keep_last
+        self.note_chars = note_chars
+        self.model_name = model_name
+
+    def compact(self, messages: List[BaseMessage], reserved_tokens: int = 0) -> List[BaseMessage]:
+        """Return messages folded until they fit the budget.
+
+        Args:
+            messages: Full message history, left untouched
+            reserved_tokens: Tokens already used by the rest of the prompt (e.g. system prompt)
+
+        Returns:
+            Message list fitting max_tokens when possible
+        """
+        budget = self.max_tokens - reserved_tokens
+        total = count_message_tokens(messages, self.model_name)
+        if total <= budget:
+            return messages
+
+        compacted = list(messages)
+        foldable = len(compacted) - self.keep_last
+        for i in range(max(foldable, 0)):
+            if total <= budget:
+                break
+            message = compacted[i]
+            if not isinstance(message, ToolMessage):
+                continue
+            note = self._fold(message)
+            if note is None:
+                continue
+            total -= count_tokens(message.text, self.model_name) - count_tokens(note.text, self.model_name)
+            compacted[i] = note
+
+        return compacted
+
+    def _fold(self, message: ToolMessage) -> Optional[ToolMessage]:
+        content = message.text
+        if len(content) <= self.note_chars:
+            return None
+        urls = re.findall(r"^URL: (\S+)", content, flags=re.MULTILINE)
+        note = f"[Compacted {message.name} output]\n{content[:self.note_chars]}..."
+        if urls:
+            note += "\nSources: " + ", ".join(urls)
+        return message.model_copy(update={"content": note})
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+
+# Keys of the deadline of a run inside config["configurable"]
+DEADLINE_KEY = "deadline"
+SUMMARY_RESERVE_KEY = "summary_reserve"
+ON_DEADLINE_KEY = "on_deadline"
+
+DEFAULT_SUMMARY_RESERVE = 30.0
+
+# Summarizations left after a node of each graph: macro summarizer, lead summarizer, research agent summarizer.
+# A research branch must be done once only the summarizations above it still fit in the time left.
+MACRO_SUMMARIES = 1
+LEAD_SUMMARIES = 2
+AGENT_SUMMARIES = 3
+# Part of a summarization window a nested agent gets to return its partial result before its caller cancels it
+CANCEL_GRACE = 0.25
+
+PARTIAL_NOTICE = "[Partial result: the time budget of the run ran out before all research finished.]"
+RESEARCH_SKIPPED = "Research not started: the time budget of the run is spent."
+RESEARCH_CANCELLED = "Research cancelled: the time budget of the run ran out before it finished."
+TOOL_SKIPPED = "Not run: the time budget of the run is spent."
+
+
+def with_deadline(config: Optional[RunnableConfig], settings: Optional[dict] = None, time_budget: Optional[float] = None) -> Optional[RunnableConfig]:
+    """Return a copy of config carrying the deadline of the run, unless it already has one.
+
+    Nested agents receive their caller's config, so they keep the caller's deadline.
+
+    Args:
+        config: LangGraph config of the invocation, possibly None
+        settings: deadline section of config/llm.yaml (time_budget, summary_reserve, on_deadline)
+        time_budget: Seconds the invocation may take, overriding settings
+
+    Returns:
+        The config to invoke the graph with, unchanged when there is no time budget
+    """
+    settings = settings or {}
+    time_budget = time_budget if time_budget is not None else settings.get("time_budget")
+    if time_budget is None or (config or {}).get("configurable", {}).get(DEADLINE_KEY) is not None:
+        return config
+
+    config = dict(config or {})
+    config["configurable"] = {
+        **config.get("configurable", {}),
+        # Wall clock, so a deadline read back from a checkpoint keeps its meaning
+        DEADLINE_KEY: time.time() + time_budget,
+        # Never reserve more than the budget allows for the three levels of summaries
+        SUMMARY_RESERVE_KEY: min(settings.get("summary_reserve", DEFAULT_SUMMARY_RESERVE), time_budget / (2 * AGENT_SUMMARIES)),
+        ON_DEADLINE_KEY: settings.get("on_deadline", "cancel"),
+    }
+    return config
+
+
+def time_left(config: Optional[RunnableConfig], reserved_summaries: float = 0) -> Optional[float]:
+    """Seconds left before the deadline, keeping reserved_summaries summarization windows; None without deadline."""
+    configurable = (config or {}).get("configurable", {})
+    deadline = configurable.get(DEADLINE_KEY)
+    if deadline is None:
+        return None
+    reserve = configurable.get(SUMMARY_RESERVE_KEY, DEFAULT_SUMMARY_RESERVE)
+    return deadline - reserved_summaries * reserve - time.time()
+
+
+def out_of_time(config: Optional[RunnableConfig], reserved_summaries: float = 0) -> bool:
+    """Whether the deadline, minus reserved_summaries summarization windows, has passed."""
+    left = time_left(config, reserved_summaries)
+    return left is not None and left <= 0
+
+
+async def until_deadline(config: Optional[RunnableConfig], awaitable: Awaitable[Any], reserved_summaries: float = 0) -> Any:
+    """Await awaitable, cancelling it once only reserved_summaries summarization windows are left.
+
+    With on_deadline set to "finish", or without deadline, awaitable runs to completion.
+    Cancellation propagates into nested graphs and their HTTP requests.
+
+    Raises:
+        asyncio.TimeoutError: When awaitable was cancelled at the deadline
+    """
+    left = time_left(config, reserved_summaries)
+    if left is None or (config or {}).get("configurable", {}).get(ON_DEADLINE_KEY) == "finish":
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout=max(left, 0))
+
+
+def mark_partial(summary: str) -> str:
+    """Head summary with the partial result notice."""
+    return f"{PARTIAL_NOTICE}\n\n{summary}"
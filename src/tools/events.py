@@ -0,0 +1,71 @@
+import time
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+Phase = Literal["current_state", "future_events"]
+
+
+class MacroEvent(BaseModel):
+    """Base class of the events yielded by MacroAgent.astream."""
+    type: str
+    phase: Optional[Phase] = None
+    timestamp: float = Field(default_factory=time.time)
+
+
+class PlannerDecision(MacroEvent):
+    """A planner turn: the research it asks for, or ResearchComplete."""
+    type: Literal["planner_decision"] = "planner_decision"
+    content: str = ""
+    tool_calls: list[dict] = Field(default_factory=list)
+    # Prompt tokens of the turn, and how many of them the provider served from its prompt cache
+    input_tokens: int = 0
+    cached_tokens: int = 0
+
+
+class ResearchLaunched(MacroEvent):
+    """A ConductResearch call, of a planner or of a research lead agent."""
+    type: Literal["research_launched"] = "research_launched"
+    tool_call_id: str
+    research_topic: str
+    # Tool call ids of the research branches the call is nested in, outermost first; empty for the planners' calls
+    branch_path: list[str] = Field(default_factory=list)
+
+
+class ResearchCompleted(MacroEvent):
+    """The summary of one research topic, emitted as soon as that topic finishes."""
+    type: Literal["research_completed"] = "research_completed"
+    tool_call_id: str
+    research_topic: str
+    research_summary: str
+    duration_s: float
+    branch_path: list[str] = Field(default_factory=list)
+    # Earlier near-duplicate topic whose summary was reused, instead of running a new research agent
+    reused_from: Optional[str] = None
+
+
+class PhaseSummary(MacroEvent):
+    """The summary of a phase, current state or future events."""
+    type: Literal["phase_summary"] = "phase_summary"
+    summary: str
+    # Written from the research done before the time budget of the run ran out
+    partial: bool = False
+
+
+class RunCompleted(MacroEvent):
+    """Last event of a stream, carrying the final graph state."""
+    type: Literal["run_completed"] = "run_completed"
+    state: dict[str, Any]
+
+
+def emit(event: MacroEvent) -> None:
+    """Send event to the custom stream of the running graph; no-op outside astream."""
+    from langgraph.config import get_stream_writer
+
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Called outside a graph run
+        return
+    writer(event)
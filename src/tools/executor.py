@@ -0,0 +1,95 @@
+import asyncio
+import time
+import weakref
+from typing import List, Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from tools.metrics import metrics
+
+
+class ToolExecutor:
+    """Run the tool calls of an AI message once each, concurrently.
+
+    Every tool can get its own concurrency limit and timeout (e.g. fewer
+    concurrent tavily_search than think_tool). Limits are shared by all the
+    invocations going through the same executor. A failing, unknown or timed
+    out call produces a ToolMessage with status="error" instead of raising, and
+    every ToolMessage carries its timing in response_metadata["tool_timing"].
+    """
+
+    def __init__(self, tools, limits: Optional[dict] = None, default_timeout: Optional[float] = None):
+        """
+        Args:
+            tools: Tools that can be called
+            limits: Per-tool settings, {tool_name: {"max_concurrency": int, "timeout": float}}
+            default_timeout: Timeout in seconds of tools without their own (None to disable)
+        """
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.limits = limits or {}
+        self.default_timeout = default_timeout
+        # Semaphores are bound to an event loop, keep one set per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, name: str) -> Optional[asyncio.Semaphore]:
+        max_concurrency = self.limits.get(name, {}).get("max_concurrency")
+        if not max_concurrency:
+            return None
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if name not in semaphores:
+            semaphores[name] = asyncio.Semaphore(max_concurrency)
+        return semaphores[name]
+
+    async def aexecute(self, tool_calls: List[dict], config: Optional[RunnableConfig] = None) -> List[ToolMessage]:
+        """Execute tool calls concurrently.
+
+        Args:
+            tool_calls: Tool calls of the last AI message
+            config: Config passed on to the tools
+
+        Returns:
+            One ToolMessage per tool call, in the same order as tool_calls
+        """
+        return list(await asyncio.gather(*(self._run(tool_call, config) for tool_call in tool_calls)))
+
+    async def _run(self, tool_call: dict, config: Optional[RunnableConfig]) -> ToolMessage:
+        name = tool_call["name"]
+        timeout = self.limits.get(name, {}).get("timeout", self.default_timeout)
+        queued_at = time.perf_counter()
+        started_at = queued_at
+        status = "success"
+
+        try:
+            tool = self.tools_by_name.get(name)
+            if tool is None:
+                raise KeyError(f"unknown tool '{name}'")
+            semaphore = self._semaphore(name)
+            if semaphore is None:
+                content = await asyncio.wait_for(tool.ainvoke(tool_call["args"], config=config), timeout=timeout)
+            else:
+                async with semaphore:
+                    started_at = time.perf_counter()
+                    content = await asyncio.wait_for(tool.ainvoke(tool_call["args"], config=config), timeout=timeout)
+        except asyncio.TimeoutError:
+            status = "error"
+            content = f"Error: {name} timed out after {timeout} seconds."
+        except Exception as e:
+            status = "error"
+            content = f"Error: {name} failed with {type(e).__name__}: {str(e)}"
+
+        finished_at = time.perf_counter()
+        if metrics.enabled:
+            metrics.observe("tool_queue_seconds", started_at - queued_at, tool=name)
+        return ToolMessage(
+            content=content,
+            name=name,
+            tool_call_id=tool_call["id"],
+            status=status,
+            response_metadata={
+                "tool_timing": {
+                    "queued_s": started_at - queued_at,
+                    "duration_s": finished_at - started_at,
+                }
+            }
+        )
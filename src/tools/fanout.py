@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from prompts import compress_research_system_prompt, compress_research_human_message
+from tools.models import get_chat_model
+from tools.others import get_today_str
+
+
+# Key of the pre-compressed findings in a research ToolMessage artifact
+PRECOMPRESSED_KEY = "precompressed"
+
+
+async def run_in_completion_order(
+    calls: Sequence[Any],
+    run: Callable[[Any], Awaitable[Any]],
+    on_complete: Callable[[Any, Any], Awaitable[Any]],
+) -> List[Any]:
+    """Run every call concurrently and post-process each result as soon as it is ready.
+
+    on_complete starts the moment its branch finishes, while the other branches
+    are still running, so only the slowest branch is left waiting at the end.
+
+    Args:
+        calls: Calls to run, e.g. ConductResearch tool calls
+        run: Coroutine function running one call
+        on_complete: Coroutine function receiving a call and its result
+
+    Returns:
+        The values returned by on_complete, in the order of calls
+    """
+    async def run_indexed(index: int):
+        return index, await run(calls[index])
+
+    async def complete_indexed(index: int, result: Any):
+        return index, await on_complete(calls[index], result)
+
+    branches = [asyncio.ensure_future(run_indexed(index)) for index in range(len(calls))]
+    followups = []
+    try:
+        for next_done in asyncio.as_completed(branches):
+            index, result = await next_done
+            followups.append(asyncio.ensure_future(complete_indexed(index, result)))
+        completed = await asyncio.gather(*followups)
+    finally:
+        # Cancelled or failed: do not leave branches running in the background
+        for task in branches + followups:
+            task.cancel()
+
+    outputs = [None] * len(calls)
+    for index, output in completed:
+        outputs[index] = output
+    return outputs
+
+
+class Precompressor:
+    """Compress the findings of one research branch as soon as that branch finishes.
+
+    The compressed text goes into the ToolMessage artifact, so the message
+    content the planners see is unchanged. The final summarizers then merge
+    short, already-cleaned notes, and most of their work is done while the
+    slower branches are still running.
+    """
+
+    def __init__(self, llm_config):
+        self.llm = get_chat_model(llm_config)
+
+    @classmethod
+    def from_config(cls, llm_config: Optional[dict]) -> Optional["Precompressor"]:
+        """Build a Precompressor when the precompress_research section enables it."""
+        if not llm_config or not llm_config.get("enabled"):
+            return None
+        return cls(llm_config)
+
+    async def __call__(self, research_topic: str, research_summary: str, date: Optional[str] = None) -> Optional[str]:
+        """Return the compressed findings, or None if compression failed; date defaults to today."""
+        try:
+            response = await self.llm.ainvoke([
+                SystemMessage(content=compress_research_system_prompt.format(date=date or get_today_str())),
+                HumanMessage(content=research_summary),
+                HumanMessage(content=compress_research_human_message.format(research_topic=research_topic)),
+            ])
+            return str(response.content)
+        except Exception as e:
+            print(f"Failed to pre-compress research: {str(e)}")
+            return None
+
+
+def research_message(tool_call: dict, research_summary: str, precompressed: Optional[str] = None) -> ToolMessage:
+    """ToolMessage answering a ConductResearch call, carrying its pre-compressed findings if any."""
+    return ToolMessage(
+        content=research_summary,
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+        artifact={PRECOMPRESSED_KEY: precompressed} if precompressed else None
+    )
+
+
+def with_precompressed_content(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Replace the content of research ToolMessages by their pre-compressed findings, when present."""
+    return [
+        message.model_copy(update={"content": message.artifact[PRECOMPRESSED_KEY]})
+        if isinstance(message, ToolMessage) and isinstance(message.artifact, dict) and message.artifact.get(PRECOMPRESSED_KEY)
+        else message
+        for message in messages
+    ]
@@ -0,0 +1,201 @@
+import asyncio
+import bisect
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from tools.metrics import metrics
+
+
+DEFAULT_HEDGING = {
+    "enabled": False,
+    "percentile": 95,
+    "min_samples": 20,
+    "window": 200,
+    "max_hedge_ratio": 0.05,
+    "min_delay": 1.0,
+    "models": None,
+}
+
+
+class LatencyWindow:
+    """Latencies of the last window calls of a model, kept sorted for percentile queries."""
+
+    def __init__(self, window: int = 200):
+        self._recent = deque(maxlen=window)
+        self._sorted = []
+
+    def observe(self, latency: float) -> None:
+        if len(self._recent) == self._recent.maxlen:
+            oldest = self._recent[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._recent.append(latency)
+        bisect.insort(self._sorted, latency)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def percentile(self, percentile: float) -> float:
+        index = min(len(self._sorted) - 1, int(len(self._sorted) * percentile / 100))
+        return self._sorted[index]
+
+
+class _Request:
+    """One request of a hedged call, timed from the moment it reaches the provider."""
+
+    def __init__(self, fn: Callable[[Callable[[], None]], Awaitable[Any]]):
+        self.started_at = None
+        self.started = asyncio.Event()
+        self.task = asyncio.ensure_future(fn(self._start))
+        # The loser's outcome is never awaited, retrieve it so it is not logged as unhandled
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    def _start(self) -> None:
+        # Called again on each retry of the rate limits, the last attempt is the one timed
+        self.started_at = time.monotonic()
+        self.started.set()
+
+    def elapsed(self) -> Optional[float]:
+        return time.monotonic() - self.started_at if self.started_at is not None else None
+
+    async def wait_started(self) -> None:
+        """Wait until the request reaches the provider, or ends while still queued."""
+        started = asyncio.ensure_future(self.started.wait())
+        try:
+            await asyncio.wait({self.task, started}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            started.cancel()
+
+
+class HedgingPolicy:
+    """Opt-in hedging of slow chat model calls, to cut their latency tail.
+
+    Latencies are measured from the moment a request reaches the provider,
+    after its rate-limit and concurrency budget waits, so queueing under load
+    neither inflates the percentile nor triggers hedges. Once a request has run
+    longer than the configured latency percentile of its model, a duplicate
+    request is sent. The first of the two to succeed wins,
+    and the other one is cancelled. Hedges are capped at max_hedge_ratio of the
+    calls of each model, so the extra cost stays bounded. Until a model has
+    min_samples latencies its calls are not hedged.
+
+    Configured from the hedging section of config/llm.yaml.
+    """
+
+    def __init__(self, **settings):
+        self.settings = {**DEFAULT_HEDGING, **settings}
+        self._latencies = {}
+        self._calls = {}
+        self._hedges = {}
+        self._wins = {}
+
+    def configure(self, settings: Optional[dict]) -> None:
+        """Apply the hedging section of config/llm.yaml."""
+        self.settings.update(settings or {})
+
+    def applies_to(self, model_name: str) -> bool:
+        models = self.settings.get("models")
+        return bool(self.settings.get("enabled")) and (models is None or model_name in models)
+
+    def _window(self, model_name: str) -> LatencyWindow:
+        if model_name not in self._latencies:
+            self._latencies[model_name] = LatencyWindow(self.settings["window"])
+        return self._latencies[model_name]
+
+    def hedge_delay(self, model_name: str) -> Optional[float]:
+        """Seconds after which a call of model_name is hedged, None when it must not be."""
+        window = self._window(model_name)
+        if len(window) < self.settings["min_samples"]:
+            return None
+        # Budget: hedges stay under max_hedge_ratio of the calls of the model
+        if self._hedges.get(model_name, 0) + 1 > self.settings["max_hedge_ratio"] * self._calls.get(model_name, 0):
+            return None
+        return max(window.percentile(self.settings["percentile"]), self.settings["min_delay"])
+
+    def _observe(self, model_name: str, request: _Request) -> None:
+        latency = request.elapsed()
+        if latency is not None:
+            self._window(model_name).observe(latency)
+
+    async def call(self, model_name: str, fn: Callable[[Callable[[], None]], Awaitable[Any]]) -> Any:
+        """Run fn, hedging it with a second fn call when it is slower than usual.
+
+        Args:
+            model_name: Model of the call, whose latencies set the hedging delay
+            fn: Coroutine factory performing one request; it gets a callback to call
+                once the request is sent to the provider, after any queueing
+
+        Returns:
+            The result of the first request to succeed
+        """
+        self._calls[model_name] = self._calls.get(model_name, 0) + 1
+        delay = self.hedge_delay(model_name)
+        primary = _Request(fn)
+        hedge = None
+        try:
+            if delay is None:
+                result = await primary.task
+                self._observe(model_name, primary)
+                return result
+
+            # Queueing for the rate limits and the budget does not count towards the delay
+            await primary.wait_started()
+            if not primary.task.done():
+                await asyncio.wait({primary.task}, timeout=max(delay - primary.elapsed(), 0))
+            if primary.task.done():
+                result = primary.task.result()
+                self._observe(model_name, primary)
+                return result
+
+            self._hedges[model_name] = self._hedges.get(model_name, 0) + 1
+            if metrics.enabled:
+                metrics.increment("llm_hedges_total", model=model_name)
+            hedge = _Request(fn)
+            winner = await _first_success(primary.task, hedge.task)
+            if winner is hedge.task:
+                self._wins[model_name] = self._wins.get(model_name, 0) + 1
+                if metrics.enabled:
+                    metrics.increment("llm_hedge_wins_total", model=model_name)
+            # The primary's latency, as it would have been without hedging, is unknown: record the time
+            # it has been at the provider, so a slow period raises the percentile and hedging backs off
+            self._observe(model_name, primary)
+            return winner.result()
+        finally:
+            # Cancel the losing request, or both when the caller was cancelled
+            primary.task.cancel()
+            if hedge is not None:
+                hedge.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            model_name: {
+                "calls": self._calls.get(model_name, 0),
+                "hedges": self._hedges.get(model_name, 0),
+                "hedge_wins": self._wins.get(model_name, 0),
+                "hedge_delay": self.hedge_delay(model_name),
+            }
+            for model_name in self._calls
+        }
+
+
+async def _first_success(*tasks: asyncio.Future) -> asyncio.Future:
+    """Wait for the first task to succeed; when all fail, return the first one to fail."""
+    pending = set(tasks)
+    first_failed = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                return task
+            if first_failed is None:
+                first_failed = task
+    return first_failed
+
+
+hedging = HedgingPolicy()
+
+
+def configure_hedging(settings: Optional[dict]) -> None:
+    """Apply the hedging section of config/llm.yaml to the process-wide policy."""
+    if settings:
+        hedging.configure(settings)
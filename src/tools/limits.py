@@ -0,0 +1,381 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables.config import ensure_config
+
+from tools.hedging import hedging
+from tools.registry import get_branch_path
+from tools.scheduler import concurrency_budget
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    consume may push the bucket below zero to settle the difference between an
+    estimate and the actual usage; later acquisitions then wait off the debt.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Wait until amount tokens are available and take them."""
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Take amount tokens without waiting (negative amounts give tokens back)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit adjusted with AIMD (additive increase, multiplicative decrease).
+
+    Every successful call within the latency target grows the limit by 1/limit,
+    i.e. about +1 per window of calls. A rate-limited call, or one slower than
+    the target, halves the limit, at most once per cooldown so a burst of 429s
+    counts as a single congestion signal.
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, latency_target: Optional[float] = None, cooldown: float = 1.0):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    async def acquire(self) -> None:
+        while self.in_flight >= max(int(self.limit), 1):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Woken while being cancelled: pass the wakeup on
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = max(int(self.limit), 1) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self, latency: float) -> None:
+        if self.latency_target is not None and latency > self.latency_target:
+            self.on_congestion()
+            return
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_congestion(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit / 2)
+
+
+class RateLimiter:
+    """Requests/minute and tokens/minute buckets plus adaptive concurrency for one model or provider."""
+
+    def __init__(
+        self,
+        key: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        latency_target: Optional[float] = None,
+    ):
+        self.key = key
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency, latency_target)
+        self.rate_limited = 0
+
+    async def acquire(self, estimated_tokens: int = 0) -> None:
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None and estimated_tokens:
+            await self.tokens.acquire(estimated_tokens)
+        await self.concurrency.acquire()
+
+    def release(self) -> None:
+        self.concurrency.release()
+
+    def on_success(self, latency: float, extra_tokens: int = 0) -> None:
+        if self.tokens is not None and extra_tokens:
+            self.tokens.consume(extra_tokens)
+        self.concurrency.on_success(latency)
+
+    def on_rate_limited(self) -> None:
+        self.rate_limited += 1
+        self.concurrency.on_congestion()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+            "rate_limited": self.rate_limited,
+            "request_tokens": self.requests.tokens if self.requests else None,
+            "tokens": self.tokens.tokens if self.tokens else None,
+        }
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether error is a provider 429 / rate-limit error (OpenAI, Tavily or raw httpx)."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if getattr(getattr(error, "response", None), "status_code", None) == 429:
+        return True
+    return "RateLimit" in type(error).__name__
+
+
+# Statuses worth retrying: request timeout, conflict and server errors
+TRANSIENT_STATUSES = frozenset({408, 409, 500, 502, 503, 504})
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether error is a transient provider error: retryable status, timeout or connection error."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in TRANSIENT_STATUSES or (isinstance(status, int) and status >= 500):
+        return True
+    # openai.APIConnectionError / APITimeoutError and httpx transport errors (ConnectError, ReadTimeout, ...)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return bool(names & {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException"})
+
+
+class RateLimits:
+    """Process-wide set of rate limiters, keyed by provider and model name.
+
+    Configured from the rate_limits section of config/llm.yaml. A call goes
+    through every configured limiter among its keys (e.g. "openai" and
+    "gpt-4o-mini"), and rate-limit errors are retried with full-jitter
+    exponential backoff after shrinking the concurrency limits. Transient
+    errors (5xx, timeouts, connection errors) are retried with the same backoff,
+    without shrinking the limits; the SDK's own retries are turned off for
+    configured models so that 429s reach the limiters.
+    """
+
+    def __init__(self):
+        self.settings = {}
+        self.max_retries = 5
+        self.base_delay = 1.0
+        self.max_delay = 60.0
+        self.expected_output_tokens = 512
+        self._limiters = {}
+
+    def configure(self, settings: Optional[dict]) -> None:
+        """Apply the rate_limits section of config/llm.yaml; existing limiters are rebuilt."""
+        settings = dict(settings or {})
+        retry = settings.pop("retry", {})
+        self.max_retries = retry.get("max_retries", self.max_retries)
+        self.base_delay = retry.get("base_delay", self.base_delay)
+        self.max_delay = retry.get("max_delay", self.max_delay)
+        self.expected_output_tokens = retry.get("expected_output_tokens", self.expected_output_tokens)
+        if settings != self.settings:
+            self.settings = settings
+            self._limiters = {}
+
+    def is_configured(self, *keys: str) -> bool:
+        return any(key in self.settings for key in keys)
+
+    def get(self, key: str) -> Optional[RateLimiter]:
+        """Return the limiter of key, or None when key has no configured limits."""
+        if key not in self.settings:
+            return None
+        if key not in self._limiters:
+            self._limiters[key] = RateLimiter(key, **self.settings[key])
+        return self._limiters[key]
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(
+        self,
+        keys: List[str],
+        fn: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0,
+        used_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """Run fn under the limiters of keys, retrying rate-limit and transient errors.
+
+        Args:
+            keys: Limiter keys of the call, typically provider and model name
+            fn: Coroutine factory performing the request
+            estimated_tokens: Tokens reserved in the tokens/minute buckets before the call
+            used_tokens: Extracts the actual token usage from the result, to settle the estimate
+
+        Returns:
+            The result of fn
+        """
+        # Without configured limiters the call is still retried: the SDK's own retries are off
+        limiters = [limiter for limiter in (self.get(key) for key in keys) if limiter is not None]
+
+        attempt = 0
+        while True:
+            acquired = []
+            try:
+                for limiter in limiters:
+                    await limiter.acquire(estimated_tokens)
+                    acquired.append(limiter)
+                start = time.monotonic()
+                result = await fn()
+            except Exception as e:
+                for limiter in acquired:
+                    limiter.release()
+                rate_limited = is_rate_limit_error(e)
+                if not (rate_limited or is_transient_error(e)) or attempt >= self.max_retries:
+                    raise
+                if rate_limited:
+                    for limiter in limiters:
+                        limiter.on_rate_limited()
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancellation: give the slots back and propagate
+                for limiter in acquired:
+                    limiter.release()
+                raise
+
+            latency = time.monotonic() - start
+            actual_tokens = used_tokens(result) if used_tokens else None
+            extra_tokens = actual_tokens - estimated_tokens if actual_tokens else 0
+            for limiter in limiters:
+                limiter.release()
+                limiter.on_success(latency, extra_tokens)
+            return result
+
+    def call_sync(self, fn: Callable[[], Any]) -> Any:
+        """Run fn, retrying rate-limit and transient errors with backoff.
+
+        Sync calls do not go through the limiters, which are asyncio based, but
+        get the retries the SDK would otherwise have made.
+        """
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if not (is_rate_limit_error(e) or is_transient_error(e)) or attempt >= self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+
+    def stats(self) -> dict:
+        return {key: limiter.stats() for key, limiter in self._limiters.items()}
+
+
+rate_limits = RateLimits()
+
+
+def _used_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None) if isinstance(result, AIMessage) else None
+    return usage.get("total_tokens") if usage else None
+
+
+class RateLimitedModel:
+    """Chat model (or bound runnable) whose async calls go through the process-wide rate limits.
+
+    Each request also holds an llm_calls slot of the concurrency budget,
+    shared fairly between the research branches of every run, and the call is
+    hedged when the hedging policy covers the model. Attribute access is
+    delegated to the wrapped runnable. Only ainvoke is limited; the sync invoke
+    only gets the retries of the rate limits.
+
+    limited is decided when the model is built, together with turning off the
+    SDK's retries: an unlimited model keeps the SDK's retries and is never
+    retried by the rate limits, so the two never stack.
+    """
+
+    def __init__(self, runnable, model_name: str, provider: str, limited: bool = True):
+        self.runnable = runnable
+        self.model_name = model_name
+        self.provider = provider
+        self.limited = limited
+
+    def _estimate_tokens(self, input) -> int:
+        from tools.context import count_message_tokens, count_tokens
+
+        if isinstance(input, list) and all(isinstance(m, BaseMessage) for m in input):
+            prompt_tokens = count_message_tokens(input, self.model_name)
+        else:
+            prompt_tokens = count_tokens(str(input), self.model_name)
+        return prompt_tokens + rate_limits.expected_output_tokens
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if hedging.applies_to(self.model_name):
+            # Each request of a hedged pair goes through the budget and the rate limits on its own
+            return await hedging.call(self.model_name, lambda on_request: self._ainvoke(input, config, on_request=on_request, **kwargs))
+        return await self._ainvoke(input, config, **kwargs)
+
+    async def _ainvoke(self, input, config=None, on_request=None, **kwargs):
+        keys = [self.provider, self.model_name]
+        # The calling node's config comes from the context when not passed explicitly
+        path = get_branch_path(ensure_config(config))
+
+        async def attempt():
+            # The budget slot is held per request only, never across a backoff sleep of the rate limits
+            async with concurrency_budget.slot("llm_calls", path):
+                if on_request is not None:
+                    # Past every queue: hedging times the request from here
+                    on_request()
+                return await self.runnable.ainvoke(input, config=config, **kwargs)
+
+        if not self.limited:
+            return await attempt()
+        return await rate_limits.call(
+            keys,
+            attempt,
+            estimated_tokens=self._estimate_tokens(input),
+            used_tokens=_used_tokens,
+        )
+
+    def invoke(self, input, config=None, **kwargs):
+        if not self.limited:
+            return self.runnable.invoke(input, config=config, **kwargs)
+        # The SDK's retries are off for configured models, retry here instead
+        return rate_limits.call_sync(lambda: self.runnable.invoke(input, config=config, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.runnable, name)
+
+
+def configure_rate_limits(settings: Optional[dict]) -> None:
+    """Apply the rate_limits section of config/llm.yaml to the process-wide limiters."""
+    if settings:
+        rate_limits.configure(settings)
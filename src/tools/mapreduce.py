@@ -0,0 +1,112 @@
+import asyncio
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from prompts import compress_research_system_prompt, compress_research_human_message
+from tools.context import count_tokens, pack_by_tokens, split_by_tokens
+from tools.others import get_today_str
+
+
+class MapReduceSummarizer:
+    """Compress research findings too large for one call, in parallel chunks then a merge.
+
+    Notes are packed into chunks of at most chunk_tokens and compressed in
+    parallel (map). The partial findings are merged by one final call (reduce).
+    While they still exceed threshold_tokens they are mapped again, up to
+    max_levels rounds. Findings still over threshold_tokens after that are cut
+    evenly to fit before the merge, so the merge prompt stays bounded whatever
+    the size of the run.
+    """
+
+    def __init__(self, llm, model_name: str, chunk_tokens: int = 10000, threshold_tokens: int = 40000, max_concurrency: int = 4, max_levels: int = 3):
+        """
+        Args:
+            llm: Chat model compressing chunks and merging them
+            model_name: Model whose tokenizer sizes the chunks
+            chunk_tokens: Token budget of each map call
+            threshold_tokens: Findings up to this size are compressed in a single call
+            max_concurrency: Map calls in flight per summarization
+            max_levels: Maximum number of map rounds before the merge
+        """
+        self.llm = llm
+        self.model_name = model_name
+        self.chunk_tokens = chunk_tokens
+        self.threshold_tokens = threshold_tokens
+        self.max_concurrency = max_concurrency
+        self.max_levels = max_levels
+
+    @classmethod
+    def from_config(cls, llm, llm_config: dict) -> Optional["MapReduceSummarizer"]:
+        """Build a MapReduceSummarizer when the map_reduce section of llm_config enables it."""
+        settings = dict(llm_config.get("map_reduce") or {})
+        if not settings.pop("enabled", False):
+            return None
+        return cls(llm, model_name=llm_config.get("model_name"), **settings)
+
+    def _tokens(self, notes: List[str]) -> int:
+        return sum(count_tokens(note, self.model_name) for note in notes)
+
+    def needs_map_reduce(self, notes: List[str]) -> bool:
+        return self._tokens(notes) > self.threshold_tokens
+
+    async def summarize(self, notes: List[str], research_topic: str, date: Optional[str] = None) -> str:
+        """Compress notes into one set of findings.
+
+        Args:
+            notes: Research findings, one per research branch
+            research_topic: Topic the findings answer
+            date: Date shown in the prompts, today by default
+
+        Returns:
+            The merged findings
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # One system prompt for every call, so they share the provider prompt cache
+        system_message = compress_research_system_prompt.format(date=date or get_today_str())
+
+        async def compress(chunk: List[str]) -> str:
+            async with semaphore:
+                return await self._compress(system_message, chunk, research_topic)
+
+        level = 0
+        while level < self.max_levels and self.needs_map_reduce(notes):
+            chunks = pack_by_tokens(notes, self.chunk_tokens, self.model_name)
+            compressed = list(await asyncio.gather(*(compress(chunk) for chunk in chunks)))
+            shrunk = self._tokens(compressed) < self._tokens(notes)
+            notes = compressed
+            level += 1
+            if not shrunk:
+                # Another round would not bring the findings closer to the threshold
+                break
+        return await self._compress(system_message, self._fit(notes), research_topic)
+
+    def _fit(self, notes: List[str]) -> List[str]:
+        """Cut every note to an equal share of threshold_tokens when notes are still over it."""
+        if not notes or not self.needs_map_reduce(notes):
+            return notes
+        print(f"Research findings still over {self.threshold_tokens} tokens after {self.max_levels} map rounds, truncating them")
+        share = max(self.threshold_tokens // len(notes), 1)
+        return [split_by_tokens(note, share, self.model_name)[0] for note in notes]
+
+    async def _compress(self, system_message: str, notes: List[str], research_topic: str) -> str:
+        response = await self.llm.ainvoke(
+            [SystemMessage(content=system_message)]
+            + [HumanMessage(content=note) for note in notes]
+            + [HumanMessage(content=compress_research_human_message.format(research_topic=research_topic))]
+        )
+        return str(response.content)
+
+
+def research_notes(messages: List[BaseMessage]) -> List[str]:
+    """Findings of the ConductResearch calls of a message history, each headed by its research topic."""
+    topics = {
+        tool_call["id"]: tool_call["args"].get("research_topic", "")
+        for message in messages if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+    }
+    return [
+        f"Research topic: {topics.get(message.tool_call_id, '')}\n\n{message.text}"
+        for message in messages
+        if isinstance(message, ToolMessage) and message.name == "ConductResearch"
+    ]
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import math
+import re
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tools.others import SharedTask
+
+
+# Words carrying no topic information, dropped before hashing. Phase and time words such as
+# "current" or "future" are kept: they tell apart topics that are otherwise worded alike
+STOPWORDS = frozenset("""
+a an and are as at be by for from how in into is it its of on or over the their this to under
+what when where which who why with within about across between during
+""".split())
+
+# Size of the hashed feature space
+HASH_BUCKETS = 1 << 20
+# Bigrams count half, so a reworded topic with the same words still scores high
+BIGRAM_WEIGHT = 0.5
+
+
+def _normalize(word: str) -> str:
+    # Light suffix stripping so "rates" and "rate", "rising" and "rise" share a feature
+    for suffix in ("ing", "ies", "es", "s", "ed"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def _hash(gram: str) -> int:
+    return int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big") % HASH_BUCKETS
+
+
+def topic_features(topic: str) -> Counter:
+    """Hashed unigram and bigram term frequencies of a research topic."""
+    words = [_normalize(word) for word in re.findall(r"[a-z0-9]+", topic.lower()) if word not in STOPWORDS]
+    features = Counter()
+    for word in words:
+        features[_hash(word)] += 1
+    for first, second in zip(words, words[1:]):
+        features[_hash(f"{first} {second}")] += BIGRAM_WEIGHT
+    return features
+
+
+def cosine(first: Dict[int, float], second: Dict[int, float]) -> float:
+    if len(first) > len(second):
+        first, second = second, first
+    dot = sum(weight * second.get(feature, 0.0) for feature, weight in first.items())
+    norm = math.sqrt(sum(w * w for w in first.values())) * math.sqrt(sum(w * w for w in second.values()))
+    return dot / norm if norm else 0.0
+
+
+class ResearchMemo:
+    """Run-scoped memo of research results, reused for near-duplicate topics.
+
+    Each new research topic is scored against the topics already researched in
+    the same scope with a hashed TF-IDF cosine similarity, computed locally.
+    When the best score reaches the threshold the earlier result is returned,
+    awaiting it if that research is still running, instead of launching a new
+    research agent. Research still running is cancelled once all the callers
+    awaiting it are. Failed or cancelled research is not memoized.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.joins = 0
+        self.misses = 0
+        # scope -> list of (topic, features, shared task)
+        self._entries: Dict[str, List[Tuple[str, Counter, SharedTask]]] = {}
+
+    def _weights(self, features: Counter, documents: List[Counter]) -> Dict[int, float]:
+        # Smoothed IDF over the topics of the scope, so words shared by every topic weigh less
+        total = len(documents) + 1
+        return {
+            feature: count * (math.log((1 + total) / (1 + sum(1 for document in documents if feature in document))) + 1)
+            for feature, count in features.items()
+        }
+
+    def match(self, scope: str, topic: str, threshold: float) -> Optional[Tuple[str, float, SharedTask]]:
+        """Return the closest earlier topic of scope as (topic, score, task), if it reaches threshold."""
+        # Research abandoned by all its callers is being cancelled, it has no result to share
+        entries = [entry for entry in self._entries.get(scope, []) if not entry[2].abandoned]
+        if not entries:
+            return None
+        features = topic_features(topic)
+        documents = [entry_features for _, entry_features, _ in entries] + [features]
+        weights = self._weights(features, documents)
+        best = None
+        for entry_topic, entry_features, task in entries:
+            score = cosine(weights, self._weights(entry_features, documents))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (entry_topic, score, task)
+        return best
+
+    async def research(self, scope: str, topic: str, run: Callable[[], Awaitable[Any]], threshold: float) -> Tuple[Any, Optional[str]]:
+        """Return the result of researching topic, reusing a near-duplicate topic of scope if any.
+
+        Args:
+            scope: Nesting level the topic belongs to, results are only reused within it
+            topic: Research topic
+            run: Coroutine factory running the research on a miss
+            threshold: Minimum similarity, between 0 and 1, to reuse an earlier result
+
+        Returns:
+            The result, and the earlier topic it was reused from or None
+        """
+        matched = self.match(scope, topic, threshold)
+        if matched is not None:
+            matched_topic, _, task = matched
+            if task.done():
+                self.hits += 1
+            else:
+                self.joins += 1
+            # One cancelled caller does not cancel the others, the last one cancels the research
+            return await task.join(), matched_topic
+
+        self.misses += 1
+        task = SharedTask(run())
+        entry = (topic, topic_features(topic), task)
+        self._entries.setdefault(scope, []).append(entry)
+        task.add_done_callback(lambda done: self._finish(scope, entry, done))
+        return await task.join(), None
+
+    def _finish(self, scope: str, entry: tuple, task: asyncio.Future) -> None:
+        if task.cancelled() or task.exception() is not None:
+            self._entries[scope].remove(entry)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "joins": self.joins,
+            "misses": self.misses,
+            "topics": sum(len(entries) for entries in self._entries.values())
+        }
+
+
+def memo_threshold(settings: Optional[dict]) -> Optional[float]:
+    """Similarity threshold set by the research memo section of the config, None when disabled."""
+    if not settings or not settings.get("enabled"):
+        return None
+    return float(settings.get("threshold", 0.8))
@@ -0,0 +1,353 @@
+import asyncio
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+
+
+# Marks an instrumented config inside config["configurable"], so nested agents do not add a second handler
+METRICS_KEY = "metrics"
+
+METRIC_PREFIX = "macro_agent_"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, float("inf"))
+WIDTH_BUCKETS = (1, 2, 3, 4, 5, 8, 12, 16, 32, float("inf"))
+RATIO_BUCKETS = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0, float("inf"))
+
+HELP = {
+    "node_duration_seconds": "Wall time of graph node executions",
+    "node_errors_total": "Graph node executions that raised",
+    "llm_duration_seconds": "Latency of chat model calls",
+    "llm_calls_total": "Chat model calls",
+    "llm_errors_total": "Chat model calls that raised",
+    "llm_prompt_tokens_total": "Prompt tokens sent to chat models",
+    "llm_completion_tokens_total": "Completion tokens returned by chat models",
+    "llm_cached_tokens_total": "Prompt tokens served from the provider prompt cache",
+    "llm_cached_ratio": "Share of the prompt tokens of each chat model call served from the provider prompt cache",
+    "llm_tool_calls_total": "Tool calls requested by chat model responses",
+    "fanout_width": "Tool calls per chat model response requesting tools",
+    "tool_duration_seconds": "Execution time of tools",
+    "tool_calls_total": "Tool executions, by status",
+    "tool_queue_seconds": "Time tool calls waited for a per-tool concurrency slot",
+    "llm_hedges_total": "Duplicate requests sent for chat model calls slower than their hedging delay",
+    "llm_hedge_wins_total": "Hedged chat model calls won by the duplicate request",
+    "scheduler_queue_seconds": "Time research branches and chat model calls waited for a slot of the concurrency budget",
+}
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, as exported by Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": {_format_bound(bound): total for bound, total in self.cumulative()},
+        }
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """Process-wide counters and histograms of the agents, keyed by metric name and labels.
+
+    Filled by MetricsCallbackHandler (nodes, chat models, tools) and by the tool
+    executor (queueing). Configured from the metrics section of config/llm.yaml
+    and exported after every top-level run, as Prometheus text, or as a JSON
+    snapshot when the path ends with .json.
+    """
+
+    def __init__(self, enabled: bool = False, path: Optional[str] = None):
+        self.enabled = enabled
+        self.path = path
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def configure(self, settings: Optional[dict]) -> None:
+        """Apply the metrics section of config/llm.yaml."""
+        settings = settings or {}
+        self.enabled = settings.get("enabled", self.enabled)
+        self.path = settings.get("path", self.path)
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """Return every metric as JSON-serializable data."""
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [
+                    {"name": METRIC_PREFIX + name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "histograms": [
+                    {"name": METRIC_PREFIX + name, "labels": dict(labels), **histogram.snapshot()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines += [f"# HELP {METRIC_PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {METRIC_PREFIX}{name} counter"]
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines += [f"# HELP {METRIC_PREFIX}{name} {HELP.get(name, name)}", f"# TYPE {METRIC_PREFIX}{name} histogram"]
+            for bound, total in histogram.cumulative():
+                le = 'le="%s"' % _format_bound(bound)
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels, le)} {total}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the metrics to path (default: the configured path), atomically.
+
+        Returns:
+            The path written, or None when no path is configured
+        """
+        path = path or self.path
+        if not path:
+            return None
+        content = json.dumps(self.snapshot(), indent=2) if path.endswith(".json") else self.to_prometheus()
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so scrapers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+
+metrics = Metrics()
+
+
+def _node_path(metadata: dict) -> str:
+    """Nesting path of a node, e.g. current_state_tools/tool_node/llm_call."""
+    namespace = metadata.get("langgraph_checkpoint_ns") or metadata.get("langgraph_node", "")
+    # Parallel branches add task index parts ("1", "2", ...), which are dropped
+    names = (part.split(":")[0] for part in namespace.split("|"))
+    return "/".join(name for name in names if not name.isdigit())
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler recording node, chat model and tool metrics.
+
+    Graph nodes are recognized by the langgraph_node metadata LangGraph sets on
+    every run inside a node, so the same handler covers the four graphs and
+    their nesting. The metrics are exported when the outermost run ends, in a
+    worker thread when that happens on an event loop.
+    """
+
+    # Record on the event loop instead of a thread pool, recording is cheap
+    run_inline = True
+
+    def __init__(self, registry: Metrics = metrics):
+        self.registry = registry
+        self._nodes = {}
+        self._llm_calls = {}
+        self._tools = {}
+        # Exports in flight, referenced until done so they are not garbage collected
+        self._exports = set()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node runnable itself, not the runnables nested inside it
+        if node is not None and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, _node_path(metadata), time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        self._finish_node(run_id, error=False)
+        if parent_run_id is None:
+            self._export()
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._finish_node(run_id, error=True)
+        if parent_run_id is None:
+            self._export()
+
+    def _export(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write()
+            return
+        # The file IO must not block the event loop, other runs may still be in progress
+        task = loop.create_task(asyncio.to_thread(self._write))
+        self._exports.add(task)
+        task.add_done_callback(self._exports.discard)
+
+    def _write(self) -> None:
+        try:
+            self.registry.export()
+        except OSError as e:
+            print(f"Failed to export metrics: {str(e)}")
+
+    def _finish_node(self, run_id, error: bool) -> None:
+        started = self._nodes.pop(run_id, None)
+        if started is None:
+            return
+        node, path, start = started
+        self.registry.observe("node_duration_seconds", time.perf_counter() - start, node=node, path=path)
+        if error:
+            self.registry.increment("node_errors_total", node=node, path=path)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or kwargs.get("invocation_params", {}).get("model_name", "unknown")
+        self._llm_calls[run_id] = (model, metadata.get("langgraph_node", ""), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._llm_calls.pop(run_id, None)
+        if started is None:
+            return
+        model, node, start = started
+        self.registry.observe("llm_duration_seconds", time.perf_counter() - start, model=model, node=node)
+        self.registry.increment("llm_calls_total", model=model, node=node)
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                usage = getattr(message, "usage_metadata", None) or {}
+                self.registry.increment("llm_prompt_tokens_total", usage.get("input_tokens", 0), model=model, node=node)
+                self.registry.increment("llm_completion_tokens_total", usage.get("output_tokens", 0), model=model, node=node)
+                cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+                self.registry.increment("llm_cached_tokens_total", cached, model=model, node=node)
+                if usage.get("input_tokens"):
+                    self.registry.observe("llm_cached_ratio", cached / usage["input_tokens"], buckets=RATIO_BUCKETS, model=model, node=node)
+
+                tool_calls = getattr(message, "tool_calls", None) or []
+                if tool_calls:
+                    self.registry.observe("fanout_width", len(tool_calls), buckets=WIDTH_BUCKETS, node=node)
+                for tool_call in tool_calls:
+                    self.registry.increment("llm_tool_calls_total", node=node, tool=tool_call["name"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._llm_calls.pop(run_id, None)
+        if started is not None:
+            model, node, _ = started
+            self.registry.increment("llm_errors_total", model=model, node=node, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._tools[run_id] = ((serialized or {}).get("name") or kwargs.get("name", "unknown"), time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish_tool(run_id, "success")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, "error")
+
+    def _finish_tool(self, run_id, status: str) -> None:
+        started = self._tools.pop(run_id, None)
+        if started is None:
+            return
+        tool, start = started
+        self.registry.observe("tool_duration_seconds", time.perf_counter() - start, tool=tool)
+        self.registry.increment("tool_calls_total", tool=tool, status=status)
+
+
+def instrument(config: Optional[RunnableConfig]) -> Optional[RunnableConfig]:
+    """Return a copy of config carrying a MetricsCallbackHandler, when metrics are enabled.
+
+    Nested agents receive their caller's config, which already carries the
+    handler through its callback manager, so they are left unchanged.
+
+    Args:
+        config: LangGraph config of the invocation, possibly None
+
+    Returns:
+        The config to invoke the graph with
+    """
+    if not metrics.enabled or (config or {}).get("configurable", {}).get(METRICS_KEY):
+        return config
+
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), METRICS_KEY: True}
+    handler = MetricsCallbackHandler(metrics)
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [handler]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = callbacks + [handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+        config["callbacks"] = callbacks
+    return config
+
+
+def configure_metrics(settings: Optional[dict]) -> None:
+    """Apply the metrics section of config/llm.yaml to the process-wide metrics."""
+    if settings:
+        metrics.configure(settings)
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+from typing import Optional, Sequence
+
+from tools.limits import RateLimitedModel, rate_limits
+
+
+# Connection pool settings shared by every model and HTTP client of the process
+DEFAULT_HTTP_SETTINGS = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 60.0,
+    "timeout": 120.0,
+    "prewarm": False,
+}
+
+# Endpoints requested by ModelRegistry.prewarm, per pool
+PREWARM_URLS = {
+    "openai": "https://api.openai.com/v1/models",
+    "tavily": "https://api.tavily.com",
+}
+
+
+def init_chat_model(*args, **kwargs):
+    """Lazy proxy for langchain's init_chat_model.
+
+    The langchain package is only imported when the first model is built, so
+    importing graph modules stays cheap.
+    """
+    from langchain.chat_models import init_chat_model as _init_chat_model
+    return _init_chat_model(*args, **kwargs)
+
+
+def model_provider(model_name: str) -> str:
+    """Return the provider of a model name, as used for rate limits and pools."""
+    if model_name.startswith(("openai:", "gpt-", "o1", "o3", "o4")):
+        return "openai"
+    return model_name.split(":")[0] if ":" in model_name else model_name
+
+
+class ModelRegistry:
+    """Process-wide registry of chat models and HTTP connection pools.
+
+    Models are shared per (model_name, temperature) and their tool-bound or
+    structured-output variants per bound tool names / schema, so every node
+    asking for the same configuration gets the same instance. All models talk
+    through one sync and one async httpx client per pool, whose limits and
+    keep-alive are set with configure, and their async calls go through the
+    process-wide rate limits.
+    """
+
+    def __init__(self, **http_settings):
+        self.http_settings = {**DEFAULT_HTTP_SETTINGS, **http_settings}
+        self._models = {}
+        self._base_models = {}
+        self._http_clients = {}
+        self._prewarmed = False
+        self._lock = threading.Lock()
+
+    def configure(self, **http_settings) -> None:
+        """Update connection pool settings; only affects pools not created yet."""
+        with self._lock:
+            if self._http_clients and any(self.http_settings.get(k) != v for k, v in http_settings.items()):
+                print("HTTP pools already created, new pool settings apply to new pools only")
+            self.http_settings.update(http_settings)
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(
+            max_connections=self.http_settings["max_connections"],
+            max_keepalive_connections=self.http_settings["max_keepalive_connections"],
+            keepalive_expiry=self.http_settings["keepalive_expiry"],
+        )
+
+    def get_http_client(self, pool: str = "openai", asynchronous: bool = True):
+        """Return the shared httpx client of a pool, creating it on first use.
+
+        Args:
+            pool: Name of the pool, one per remote service
+            asynchronous: Whether to return the httpx.AsyncClient or the httpx.Client
+
+        Returns:
+            The shared httpx client
+        """
+        key = (pool, asynchronous)
+        with self._lock:
+            if key not in self._http_clients:
+                import httpx
+                client_class = httpx.AsyncClient if asynchronous else httpx.Client
+                self._http_clients[key] = client_class(limits=self._limits(), timeout=self.http_settings["timeout"])
+            return self._http_clients[key]
+
+    def get_chat_model(self, model_name: str, temperature: Optional[float] = None, tools: Optional[Sequence] = None, schema=None):
+        """Return a shared chat model, optionally bound to tools or a structured output schema.
+
+        Args:
+            model_name: Name of the model, as accepted by init_chat_model
+            temperature: Sampling temperature
+            tools: Tools to bind to the model
+            schema: Pydantic schema for structured output
+
+        Returns:
+            The shared model (or runnable) for this configuration
+        """
+        # Decided per model when it is built, so a later configure_rate_limits gets new models
+        limited = rate_limits.is_configured(model_provider(model_name), model_name)
+        base_key = (model_name, temperature, limited)
+        if tools is not None:
+            key = base_key + ("tools", tuple(getattr(tool, "name", getattr(tool, "__name__", repr(tool))) for tool in tools))
+        elif schema is not None:
+            key = base_key + ("schema", f"{schema.__module__}.{schema.__qualname__}")
+        else:
+            key = base_key
+
+        with self._lock:
+            model = self._models.get(key)
+        if model is not None:
+            return model
+
+        base_model = self._base_model(model_name, temperature, limited)
+        if tools is not None:
+            runnable = base_model.bind_tools(tools)
+        elif schema is not None:
+            runnable = base_model.with_structured_output(schema)
+        else:
+            runnable = base_model
+        model = RateLimitedModel(runnable, model_name=model_name, provider=model_provider(model_name), limited=limited)
+
+        with self._lock:
+            # Another thread may have won the race, keep the first instance
+            return self._models.setdefault(key, model)
+
+    def _base_model(self, model_name: str, temperature: Optional[float], limited: bool):
+        key = (model_name, temperature, limited)
+        with self._lock:
+            model = self._base_models.get(key)
+        if model is not None:
+            return model
+
+        kwargs = {}
+        if model_provider(model_name) == "openai":
+            kwargs = {
+                "http_client": self.get_http_client("openai", asynchronous=False),
+                "http_async_client": self.get_http_client("openai", asynchronous=True),
+            }
+        if limited:
+            # 429s, 5xx and connection errors are retried by the rate limits, which need to see the 429s
+            kwargs["max_retries"] = 0
+        model = init_chat_model(model=model_name, temperature=temperature, **kwargs)
+
+        with self._lock:
+            return self._base_models.setdefault(key, model)
+
+    async def prewarm(self, pools: Sequence[str] = ("openai", "tavily")) -> None:
+        """Open a keep-alive connection per pool so the first real call skips DNS and TLS setup."""
+        async def warm(pool: str):
+            try:
+                await self.get_http_client(pool).get(PREWARM_URLS[pool])
+            except Exception as e:
+                print(f"Failed to prewarm {pool} pool: {str(e)}")
+
+        await asyncio.gather(*(warm(pool) for pool in pools))
+        self._prewarmed = True
+
+    async def prewarm_once(self) -> None:
+        """Prewarm the pools on the first call when enabled in the settings."""
+        if self.http_settings.get("prewarm") and not self._prewarmed:
+            await self.prewarm()
+
+    def clear(self) -> None:
+        """Drop cached models and pools; sync pools are closed, async ones are left to the garbage collector."""
+        with self._lock:
+            clients, self._http_clients = self._http_clients, {}
+            self._models = {}
+            self._base_models = {}
+            self._prewarmed = False
+        for (pool, asynchronous), client in clients.items():
+            if not asynchronous:
+                client.close()
+
+
+model_registry = ModelRegistry()
+
+
+def get_chat_model(llm_config: dict, tools: Optional[Sequence] = None, schema=None):
+    """Return the shared chat model for a node's llm_config (model_name, temperature).
+
+    Args:
+        llm_config: Node configuration from config/llm.yaml
+        tools: Tools to bind to the model
+        schema: Pydantic schema for structured output
+
+    Returns:
+        The shared model (or runnable) for this configuration
+    """
+    return model_registry.get_chat_model(
+        model_name=llm_config.get("model_name"),
+        temperature=llm_config.get("temperature"),
+        tools=tools,
+        schema=schema,
+    )
+
+
+def configure_http_pools(http_config: Optional[dict]) -> None:
+    """Apply the http section of config/llm.yaml to the process-wide pools."""
+    if http_config:
+        model_registry.configure(**http_config)
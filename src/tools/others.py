@@ -1,7 +1,39 @@
+import asyncio
 from datetime import datetime
+from typing import Any, Awaitable
 
 
 def get_today_str() -> str:
     """Get current date in a human-readable format."""
     return datetime.now().strftime("%a %b %-d, %Y")
 
+
+class SharedTask:
+    """Task awaited by several callers, cancelled once every caller still waiting on it was cancelled.
+
+    Each caller is shielded from the others' cancellation, but the shared work,
+    with its nested graphs and HTTP requests, does not outlive its last caller.
+    """
+
+    def __init__(self, awaitable: Awaitable[Any]):
+        self.task = asyncio.ensure_future(awaitable)
+        self.waiters = 0
+        # Cancelled because every caller left; owners should stop handing it out
+        self.abandoned = False
+
+    def done(self) -> bool:
+        return self.task.done()
+
+    def add_done_callback(self, callback) -> None:
+        self.task.add_done_callback(callback)
+
+    async def join(self) -> Any:
+        """Await the shared task, cancelling it when this is its last caller and it was cancelled."""
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if not self.waiters and not self.task.done():
+                self.abandoned = True
+                self.task.cancel()
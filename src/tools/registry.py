@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from tools.memo import ResearchMemo
+from tools.others import SharedTask, get_today_str
+
+
+# Keys of the run-scoped values inside config["configurable"]
+RUN_ID_KEY = "run_id"
+URL_REGISTRY_KEY = "url_registry"
+RESEARCH_MEMO_KEY = "research_memo"
+# Date shown in the prompts, fixed for the whole run so prompt prefixes stay byte-identical
+RUN_DATE_KEY = "run_date"
+# Path of the research branch a call belongs to, (run id, macro tool call id, lead tool call id)
+BRANCH_PATH_KEY = "branch_path"
+# LangGraph checkpoints are keyed by thread id, kept equal to the run id
+THREAD_ID_KEY = "thread_id"
+
+# Run ids of the runs in progress in this process, with the number of invocations of each
+_live_runs = Counter()
+
+
+class UrlRegistry:
+    """Run-scoped single-flight registry of webpage summaries.
+
+    Parallel research agents of the same run share one registry through the
+    LangGraph config. Concurrent summarizations of the same URL collapse into a
+    single task, cancelled only when all its callers are, and once finished the
+    summary is reused for the rest of the run.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.joins = 0
+        self.misses = 0
+        self._summaries = {}
+        self._in_flight = {}
+
+    async def summarize(self, url: str, summarize: Callable[[], Awaitable[str]]) -> str:
+        """Return the summary of url, running summarize only if no other agent did.
+
+        Args:
+            url: URL of the webpage being summarized
+            summarize: Coroutine factory producing the summary on a miss
+
+        Returns:
+            The summary produced by the first caller for this URL
+        """
+        if url in self._summaries:
+            self.hits += 1
+            return self._summaries[url]
+
+        shared = self._in_flight.get(url)
+        if shared is None or shared.abandoned:
+            self.misses += 1
+            shared = SharedTask(summarize())
+            self._in_flight[url] = shared
+            shared.add_done_callback(lambda done: self._finish(url, shared, done))
+        else:
+            self.joins += 1
+
+        # One cancelled caller does not cancel the others, the last one cancels the summarization
+        return await shared.join()
+
+    def _finish(self, url: str, shared: SharedTask, task: asyncio.Future) -> None:
+        if self._in_flight.get(url) is shared:
+            del self._in_flight[url]
+        if not task.cancelled() and task.exception() is None:
+            self._summaries[url] = task.result()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "joins": self.joins, "misses": self.misses, "summaries": len(self._summaries)}
+
+
+def with_run_context(config: Optional[RunnableConfig]) -> RunnableConfig:
+    """Return a copy of config carrying the run-scoped values, creating the missing ones.
+
+    Nested agents receive their caller's config, so they join the caller's run
+    instead of starting a new one.
+
+    Args:
+        config: LangGraph config of the invocation, possibly None
+
+    Returns:
+        Config whose configurable section holds a run id, the matching thread id, the run date,
+        the branch path, a UrlRegistry and a ResearchMemo
+    """
+    config = dict(config or {})
+    configurable = dict(config.get("configurable", {}))
+    configurable.setdefault(RUN_ID_KEY, configurable.get(THREAD_ID_KEY) or uuid.uuid4().hex)
+    configurable.setdefault(THREAD_ID_KEY, configurable[RUN_ID_KEY])
+    configurable.setdefault(RUN_DATE_KEY, get_today_str())
+    configurable.setdefault(BRANCH_PATH_KEY, (configurable[RUN_ID_KEY],))
+    configurable.setdefault(URL_REGISTRY_KEY, UrlRegistry())
+    configurable.setdefault(RESEARCH_MEMO_KEY, ResearchMemo())
+    config["configurable"] = configurable
+    return config
+
+
+def get_run_id(config: Optional[RunnableConfig]) -> str:
+    """Return the run id carried by config, "default" outside a run."""
+    return (config or {}).get("configurable", {}).get(RUN_ID_KEY, "default")
+
+
+def get_run_date(config: Optional[RunnableConfig]) -> str:
+    """Return the date pinned for the run carried by config, today outside a run."""
+    return (config or {}).get("configurable", {}).get(RUN_DATE_KEY) or get_today_str()
+
+
+def with_branch(config: Optional[RunnableConfig], branch_id: str) -> RunnableConfig:
+    """Return a copy of config for the research branch branch_id, nested in the branch of config."""
+    config = dict(config or {})
+    configurable = dict(config.get("configurable", {}))
+    configurable[BRANCH_PATH_KEY] = tuple(configurable.get(BRANCH_PATH_KEY, ())) + (branch_id,)
+    config["configurable"] = configurable
+    return config
+
+
+def get_branch_path(config: Optional[RunnableConfig]) -> tuple:
+    """Return the research branch path carried by config, empty outside a run."""
+    return tuple((config or {}).get("configurable", {}).get(BRANCH_PATH_KEY, ()))
+
+
+def get_url_registry(config: Optional[RunnableConfig]) -> Optional[UrlRegistry]:
+    """Return the URL registry carried by config, if any."""
+    return (config or {}).get("configurable", {}).get(URL_REGISTRY_KEY)
+
+
+def get_research_memo(config: Optional[RunnableConfig]) -> Optional[ResearchMemo]:
+    """Return the research memo carried by config, if any."""
+    return (config or {}).get("configurable", {}).get(RESEARCH_MEMO_KEY)
+
+
+@contextmanager
+def live_run(config: Optional[RunnableConfig]):
+    """Mark the run carried by config as in progress for the duration of the block."""
+    run_id = get_run_id(config)
+    _live_runs[run_id] += 1
+    try:
+        yield
+    finally:
+        _live_runs[run_id] -= 1
+        if not _live_runs[run_id]:
+            del _live_runs[run_id]
+
+
+def is_live_run(run_id: str) -> bool:
+    """Whether run_id is in progress in this process."""
+    return run_id in _live_runs
@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import time
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from tools.metrics import metrics
+
+
+# Pools of the budget: research lead agents, research agents and chat model calls
+POOLS = ("research_leads", "research_agents", "llm_calls")
+
+DEFAULT_CONCURRENCY = {
+    "research_leads": 4,
+    "research_agents": 8,
+    "llm_calls": 32,
+    "max_per_branch": 3,
+}
+
+
+class FairShareLimiter:
+    """Concurrency limit whose free slots are shared fairly between branches.
+
+    Every acquisition carries the branch path of its caller, e.g. (run id,
+    macro tool call id, lead tool call id). When a slot frees up it goes to the
+    waiter of the least busy branch, level by level from the root: first the
+    run with the fewest slots in use, then within it the least busy macro
+    branch, and so on, oldest waiter first on ties. A wide branch therefore
+    cannot starve its siblings. max_per_branch also caps the slots held by the
+    children of a single parent branch.
+    """
+
+    def __init__(self, capacity: int, max_per_branch: Optional[int] = None):
+        self.capacity = capacity
+        self.max_per_branch = max_per_branch
+        self.in_flight = 0
+        # Slots held under every branch prefix
+        self._held = Counter()
+        # (path, sequence number, future) of the callers waiting for a slot
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def _eligible(self, path: Tuple) -> bool:
+        return self.max_per_branch is None or self._held[path[:-1]] < self.max_per_branch
+
+    def _pick(self):
+        candidates = [waiter for waiter in self._waiters if not waiter[2].done() and self._eligible(waiter[0])]
+        level = 0
+        while len(candidates) > 1:
+            deeper = [waiter for waiter in candidates if len(waiter[0]) > level]
+            if not deeper:
+                break
+            # Least busy branch at this level, the one holding the oldest waiter on ties
+            load = lambda waiter: (self._held[waiter[0][:level + 1]], waiter[1])
+            chosen = min(deeper, key=load)[0][:level + 1]
+            candidates = [waiter for waiter in deeper if waiter[0][:level + 1] == chosen]
+            level += 1
+        return min(candidates, key=lambda waiter: waiter[1]) if candidates else None
+
+    def _grant(self, path: Tuple) -> None:
+        self.in_flight += 1
+        for end in range(len(path) + 1):
+            self._held[path[:end]] += 1
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.capacity:
+            waiter = self._pick()
+            if waiter is None:
+                return
+            self._waiters.remove(waiter)
+            self._grant(waiter[0])
+            waiter[2].set_result(None)
+
+    async def acquire(self, path: Tuple) -> None:
+        waiter = (path, next(self._sequence), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._dispatch()
+        try:
+            await waiter[2]
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter[2].done() and not waiter[2].cancelled():
+                # Granted while being cancelled: hand the slot on
+                self.release(path)
+            raise
+
+    def release(self, path: Tuple) -> None:
+        self.in_flight -= 1
+        for end in range(len(path) + 1):
+            self._held[path[:end]] -= 1
+            if not self._held[path[:end]]:
+                del self._held[path[:end]]
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "in_flight": self.in_flight, "waiting": len(self._waiters)}
+
+
+class ConcurrencyBudget:
+    """Process-wide, hierarchical budget of in-flight research branches and chat model calls.
+
+    Configured from the concurrency section of config/llm.yaml. One limit per
+    pool is shared by every nesting level and every run of the process, so the
+    planner's fan-out times the lead agents' fan-out can no longer multiply
+    the load: research_leads bounds the lead agents launched by the planners,
+    research_agents the research agents launched by the lead agents, llm_calls
+    the chat model calls of all of them. max_per_branch caps the research
+    agents (and lead agents) one parent branch runs at once.
+
+    Pools never wait on one another while holding a slot of the same pool, so
+    nesting cannot deadlock.
+    """
+
+    def __init__(self, **settings):
+        self.settings = {**DEFAULT_CONCURRENCY, **settings}
+        self.enabled = False
+        # Futures are bound to an event loop, keep one set of limiters per loop
+        self._limiters = weakref.WeakKeyDictionary()
+        self._call_ids = itertools.count()
+
+    def configure(self, settings: Optional[dict]) -> None:
+        """Apply the concurrency section of config/llm.yaml; only affects limiters not created yet."""
+        settings = dict(settings or {})
+        self.enabled = settings.pop("enabled", True)
+        self.settings.update(settings)
+
+    def _limiter(self, pool: str) -> Optional[FairShareLimiter]:
+        capacity = self.settings.get(pool)
+        if not self.enabled or not capacity:
+            return None
+        limiters = self._limiters.setdefault(asyncio.get_running_loop(), {})
+        if pool not in limiters:
+            # Chat model calls have no parent cap, they are bounded per model by the rate limits
+            max_per_branch = None if pool == "llm_calls" else self.settings.get("max_per_branch")
+            limiters[pool] = FairShareLimiter(capacity, max_per_branch)
+        return limiters[pool]
+
+    @asynccontextmanager
+    async def slot(self, pool: str, path: Tuple, call_id: Optional[str] = None):
+        """Hold one slot of pool for the duration of the block.
+
+        Args:
+            pool: One of POOLS
+            path: Branch path of the caller
+            call_id: Id of the call within its branch, e.g. the tool call id; a fresh one when None
+        """
+        limiter = self._limiter(pool)
+        if limiter is None:
+            yield
+            return
+        path = tuple(path) + (call_id if call_id is not None else f"call-{next(self._call_ids)}",)
+        queued_at = time.perf_counter()
+        await limiter.acquire(path)
+        if metrics.enabled:
+            metrics.observe("scheduler_queue_seconds", time.perf_counter() - queued_at, pool=pool)
+        try:
+            yield
+        finally:
+            limiter.release(path)
+
+    def stats(self) -> dict:
+        try:
+            limiters = self._limiters.get(asyncio.get_running_loop(), {})
+        except RuntimeError:
+            limiters = {}
+        return {pool: limiter.stats() for pool, limiter in limiters.items()}
+
+
+concurrency_budget = ConcurrencyBudget()
+
+
+def configure_concurrency(settings: Optional[dict]) -> None:
+    """Apply the concurrency section of config/llm.yaml to the process-wide budget."""
+    if settings:
+        concurrency_budget.configure(settings)
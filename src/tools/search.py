@@ -1,17 +1,50 @@
 from langchain_core.tools import tool, InjectedToolArg
-from typing import Annotated, Literal, List
+from langchain_core.runnables import RunnableConfig
+from typing import Annotated, Literal, List, Optional, Tuple
+import asyncio
 
-from tools.others import get_today_str
+from tools.others import SharedTask, get_today_str
+from tools.cache import SummaryCache, SearchCache, content_key
+from tools.context import count_tokens, split_by_tokens
+from tools.registry import UrlRegistry, get_url_registry
 
 from pydantic import Field, BaseModel
 
-from tavily import TavilyClient
-from prompts import summarize_webpage_prompt
+from prompts import summarize_webpage_prompt, merge_webpage_summaries_prompt
 from langchain_core.messages import HumanMessage
-from langchain.chat_models import init_chat_model
+from tools.models import model_registry
+from tools.limits import rate_limits
 
-tavily_client = TavilyClient()
-summarization_model = init_chat_model(model="gpt-4.1") # TODO: to be in config in yaml using wrapping classes around node and graphs
+SUMMARIZATION_MODEL_NAME = "gpt-4.1" # TODO: to be in config in yaml using wrapping classes around node and graphs
+summary_cache = SummaryCache()
+search_cache = SearchCache()
+
+# Clients are built on first use, so importing this module needs neither API keys nor the tavily package
+_tavily_client = None
+_async_tavily_client = None
+
+
+def get_tavily_client():
+    """Return the shared sync Tavily client, creating it on first use."""
+    global _tavily_client
+    if _tavily_client is None:
+        from tavily import TavilyClient
+        _tavily_client = TavilyClient()
+    return _tavily_client
+
+
+def get_async_tavily_client():
+    """Return the shared async Tavily client, creating it on first use."""
+    global _async_tavily_client
+    if _async_tavily_client is None:
+        from tavily import AsyncTavilyClient
+        _async_tavily_client = AsyncTavilyClient(client=model_registry.get_http_client("tavily"))
+    return _async_tavily_client
+
+
+def get_summarization_model():
+    """Return the shared structured-output webpage summarization model."""
+    return model_registry.get_chat_model(SUMMARIZATION_MODEL_NAME, schema=Summary)
 
 
 class Summary(BaseModel):
@@ -20,11 +53,36 @@ class Summary(BaseModel):
     key_excerpts: str = Field(description="Important quotes and excerpts from the content")
 
 
+# Default bounds for the async search fan-out
+MAX_CONCURRENT_SEARCHES = 5
+SEARCH_TIMEOUT_SECONDS = 30
+# Default bound for concurrent webpage summarizations
+MAX_CONCURRENT_SUMMARIES = 5
+# Chunked summarization of oversized pages, overridden by research.summarize_webpage of config/llm.yaml
+PAGE_SUMMARY_SETTINGS = {
+    # Pages over this many tokens are summarized in chunks, then merged
+    "max_page_tokens": 32000,
+    # Token budget of each chunk of an oversized page
+    "chunk_tokens": 8000,
+    # Bound for concurrent chunk summarizations of one page
+    "max_concurrency": 4,
+    # Maximum rounds merging chunk summaries by groups before the final merge
+    "max_merge_rounds": 3,
+}
+
+
+def configure_page_summaries(settings: Optional[dict]) -> None:
+    """Apply the summarize_webpage section of config/llm.yaml to the webpage summarization."""
+    if settings:
+        PAGE_SUMMARY_SETTINGS.update(settings)
+
+
 @tool(parse_docstring=True)
-def tavily_search(
+async def tavily_search(
     query: str,
     max_results: Annotated[int, InjectedToolArg] = 3,
     topic: Annotated[Literal["general", "news", "finance"], InjectedToolArg] = "general",
+    config: RunnableConfig = None,
 ) -> str:
     """Fetch results from Tavily search API with content summarization.
 
@@ -37,7 +95,7 @@ def tavily_search(
         Formatted string of search results with summaries
     """
     # Execute search for single query
-    search_results = tavily_search_multiple(
+    search_results = await atavily_search_multiple(
         [query],  # Convert single query to list for the internal function
         max_results=max_results,
         topic=topic,
@@ -48,7 +106,7 @@ def tavily_search(
     unique_results = deduplicate_search_results(search_results)
 
     # Process results with summarization
-    summarized_results = process_search_results(unique_results)
+    summarized_results = await aprocess_search_results(unique_results, url_registry=get_url_registry(config))
 
     # Format output for consumption
     return format_search_output(summarized_results)
@@ -59,6 +117,7 @@ def tavily_search_multiple(
     max_results: int = 3, 
     topic: Literal["general", "news", "finance"] = "general", 
     include_raw_content: bool = True, 
+    use_cache: bool = True,
 ) -> List[dict]:
     """Perform search using Tavily API for multiple queries.
 
@@ -67,23 +126,135 @@ def tavily_search_multiple(
         max_results: Maximum number of results per query
         topic: Topic filter for search results
         include_raw_content: Whether to include raw webpage content
+        use_cache: Whether to serve fresh results from the search cache
 
     Returns:
         List of search result dictionaries
     """
 
-    # Execute searches sequentially. Note: yon can use AsyncTavilyClient to parallelize this step.
+    # Execute searches sequentially. Use atavily_search_multiple to run them concurrently.
     search_docs = []
     for query in search_queries:
-        result = tavily_client.search(
+        cache_key = SearchCache.key(query, max_results, topic, include_raw_content)
+        result = search_cache.get(cache_key)[0] if use_cache else None
+        if result is None:
+            # Retried like the async searches; the limiters themselves are asyncio based
+            result = rate_limits.call_sync(lambda: get_tavily_client().search(
+                query,
+                max_results=max_results,
+                include_raw_content=include_raw_content,
+                topic=topic
+            ))
+            if use_cache:
+                search_cache.set(cache_key, result, topic)
+        search_docs.append(result)
+
+    return search_docs
+
+
+async def atavily_search_multiple(
+    search_queries: List[str],
+    max_results: int = 3,
+    topic: Literal["general", "news", "finance"] = "general",
+    include_raw_content: bool = True,
+    max_concurrency: Optional[int] = MAX_CONCURRENT_SEARCHES,
+    timeout: Optional[float] = SEARCH_TIMEOUT_SECONDS,
+    use_cache: bool = True,
+    stale_while_revalidate: bool = True,
+) -> List[dict]:
+    """Perform search using the async Tavily API, running queries concurrently.
+
+    A query that fails or exceeds its timeout yields an empty result set instead
+    of failing the whole batch. Concurrent searches of the same request, e.g.
+    from parallel research agents, share a single Tavily call. With
+    stale_while_revalidate, an expired cached response is returned immediately
+    while a background search refreshes it.
+
+    Args:
+        search_queries: List of search queries to execute
+        max_results: Maximum number of results per query
+        topic: Topic filter for search results
+        include_raw_content: Whether to include raw webpage content
+        max_concurrency: Maximum number of in-flight queries (None for unbounded)
+        timeout: Per-query timeout in seconds (None to disable)
+        use_cache: Whether to read and populate the search cache
+        stale_while_revalidate: Whether to serve expired cache entries while refreshing them
+
+    Returns:
+        List of search result dictionaries, in the same order as search_queries
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def search_and_store(query: str) -> dict:
+        if semaphore is None:
+            result = await asyncio.wait_for(_asearch(query), timeout=timeout)
+        else:
+            async with semaphore:
+                result = await asyncio.wait_for(_asearch(query), timeout=timeout)
+        if use_cache:
+            await search_cache.aset(SearchCache.key(query, max_results, topic, include_raw_content), result, topic)
+        return result
+
+    async def fetch_query(query: str) -> dict:
+        # Single-flight per cache key: concurrent misses and revalidations join the search in flight
+        cache_key = SearchCache.key(query, max_results, topic, include_raw_content)
+        shared = _searches_in_flight.get(cache_key)
+        if shared is None or shared.abandoned:
+            shared = SharedTask(search_and_store(query))
+            _searches_in_flight[cache_key] = shared
+            shared.add_done_callback(lambda _: _search_done(cache_key, shared))
+        return await shared.join()
+
+    async def run_query(query: str) -> dict:
+        if use_cache:
+            cache_key = SearchCache.key(query, max_results, topic, include_raw_content)
+            cached, is_fresh = await search_cache.aget(cache_key, allow_stale=stale_while_revalidate)
+            if cached is not None:
+                if not is_fresh:
+                    _revalidate_in_background(cache_key, query, fetch_query)
+                return cached
+        try:
+            return await fetch_query(query)
+        except Exception as e:
+            print(f"Failed to search '{query}': {type(e).__name__} {str(e)}")
+            return {"query": query, "results": []}
+
+    async def _asearch(query: str) -> dict:
+        return await rate_limits.call(["tavily"], lambda: get_async_tavily_client().search(
             query,
             max_results=max_results,
             include_raw_content=include_raw_content,
             topic=topic
-        )
-        search_docs.append(result)
+        ))
+
+    # gather preserves input order regardless of completion order
+    return list(await asyncio.gather(*(run_query(query) for query in search_queries)))
+
+
+# Searches in flight, one per cache key, shared by every caller of the process
+_searches_in_flight = {}
+# Background refreshes of stale search cache entries, one per cache key
+_revalidation_tasks = {}
 
-    return search_docs
+
+def _search_done(cache_key: str, shared: SharedTask) -> None:
+    if _searches_in_flight.get(cache_key) is shared:
+        del _searches_in_flight[cache_key]
+
+
+def _revalidate_in_background(cache_key: str, query: str, fetch_query) -> None:
+    if cache_key in _revalidation_tasks:
+        return
+
+    async def revalidate():
+        try:
+            await fetch_query(query)
+        except Exception as e:
+            print(f"Failed to revalidate search '{query}': {type(e).__name__} {str(e)}")
+        finally:
+            _revalidation_tasks.pop(cache_key, None)
+
+    _revalidation_tasks[cache_key] = asyncio.create_task(revalidate())
 
 
 def deduplicate_search_results(search_results: List[dict]) -> dict:
@@ -133,6 +304,57 @@ def process_search_results(unique_results: dict) -> dict:
     return summarized_results
 
 
+async def aprocess_search_results(
+    unique_results: dict,
+    max_concurrency: Optional[int] = MAX_CONCURRENT_SUMMARIES,
+    url_registry: Optional[UrlRegistry] = None,
+) -> dict:
+    """Process search results by summarizing all available raw content concurrently.
+
+    Args:
+        unique_results: Dictionary of unique search results
+        max_concurrency: Maximum number of in-flight summarizations (None for unbounded)
+        url_registry: Run-scoped registry shared with other agents, reusing their summaries
+
+    Returns:
+        Dictionary of processed results with summaries, in the same order as unique_results
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def summarize(raw_content: str) -> str:
+        if semaphore is None:
+            return await asummarize_webpage_content(raw_content)
+        async with semaphore:
+            return await asummarize_webpage_content(raw_content)
+
+    async def process_result(url: str, result: dict) -> str:
+        # Use existing content if no raw content for summarization
+        if not result.get("raw_content"):
+            return result['content']
+        if url_registry is None:
+            return await summarize(result['raw_content'])
+        return await url_registry.summarize(url, lambda: summarize(result['raw_content']))
+
+    contents = await asyncio.gather(
+        *(process_result(url, result) for url, result in unique_results.items()),
+        return_exceptions=True,
+    )
+
+    summarized_results = {}
+    for (url, result), content in zip(unique_results.items(), contents):
+        # A failing page never fails the batch, fall back to its truncated content
+        if isinstance(content, BaseException):
+            print(f"Failed to process {url}: {str(content)}")
+            content = _truncate_webpage_content(result.get("raw_content") or result['content'])
+
+        summarized_results[url] = {
+            'title': result['title'],
+            'content': content
+        }
+
+    return summarized_results
+
+
 def format_search_output(summarized_results: dict) -> str:
     """Format search results into a well-structured string output.
 
@@ -165,26 +387,214 @@ def summarize_webpage_content(webpage_content: str) -> str:
     Returns:
         Formatted summary with key excerpts
     """
+    cache_key = _summary_cache_key(webpage_content)
+    cached_summary = summary_cache.get(cache_key)
+    if cached_summary is not None:
+        return cached_summary
+
     try:
-        # Set up structured output model for summarization
-        structured_model = summarization_model.with_structured_output(Summary)
-
-        # Generate summary
-        summary = structured_model.invoke([
-            HumanMessage(content=summarize_webpage_prompt.format(
-                webpage_content=webpage_content, 
-                date=get_today_str()
-            ))
-        ])
+        complete = True
+        if _fits_in_one_call(webpage_content):
+            # Generate summary with the structured output model
+            summary = get_summarization_model().invoke(_summarization_messages(webpage_content))
+        else:
+            summary, complete = _summarize_in_chunks(webpage_content)
 
-        # Format summary with clear structure
-        formatted_summary = (
-            f"<summary>\n{summary.summary}\n</summary>\n\n"
-            f"<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
-        )
+        formatted_summary = _format_summary(summary)
+        # A summary that lost chunks or merges is not cached, so the next hit retries them
+        if complete:
+            summary_cache.set(cache_key, formatted_summary)
+        return formatted_summary
+
+    except Exception as e:
+        print(f"Failed to summarize webpage: {str(e)}")
+        return _truncate_webpage_content(webpage_content)
 
+
+async def asummarize_webpage_content(webpage_content: str) -> str:
+    """Async version of summarize_webpage_content.
+
+    Args:
+        webpage_content: Raw webpage content to summarize
+
+    Returns:
+        Formatted summary with key excerpts
+    """
+    cache_key = _summary_cache_key(webpage_content)
+    cached_summary = await summary_cache.aget(cache_key)
+    if cached_summary is not None:
+        return cached_summary
+
+    try:
+        complete = True
+        # Tokenizing a long page takes a while, keep it off the event loop
+        if await asyncio.to_thread(_fits_in_one_call, webpage_content):
+            summary = await get_summarization_model().ainvoke(_summarization_messages(webpage_content))
+        else:
+            summary, complete = await _asummarize_in_chunks(webpage_content)
+        formatted_summary = _format_summary(summary)
+        if complete:
+            await summary_cache.aset(cache_key, formatted_summary)
         return formatted_summary
 
     except Exception as e:
         print(f"Failed to summarize webpage: {str(e)}")
-        return webpage_content[:1000] + "..." if len(webpage_content) > 1000 else webpage_content
+        return _truncate_webpage_content(webpage_content)
+
+
+def _fits_in_one_call(webpage_content: str) -> bool:
+    return count_tokens(webpage_content, SUMMARIZATION_MODEL_NAME) <= PAGE_SUMMARY_SETTINGS["max_page_tokens"]
+
+
+def _summarize_in_chunks(webpage_content: str) -> Tuple[Summary, bool]:
+    """Summarize an oversized page chunk by chunk, then merge the chunk summaries.
+
+    Returns:
+        The summary, and whether every chunk and merge succeeded
+    """
+    model = get_summarization_model()
+    partials = []
+    complete = True
+    for chunk in split_by_tokens(webpage_content, PAGE_SUMMARY_SETTINGS["chunk_tokens"], SUMMARIZATION_MODEL_NAME):
+        try:
+            partials.append(model.invoke(_summarization_messages(chunk)))
+        except Exception as e:
+            print(f"Failed to summarize webpage chunk: {str(e)}")
+            complete = False
+    if not partials:
+        raise ValueError("every chunk of the webpage failed to summarize")
+
+    for _ in range(PAGE_SUMMARY_SETTINGS["max_merge_rounds"]):
+        groups = _merge_groups(partials)
+        if len(groups) == 1:
+            break
+        partials = []
+        for group in groups:
+            try:
+                partials.append(model.invoke(_merge_messages(group)))
+            except Exception as e:
+                print(f"Failed to merge webpage chunk summaries: {str(e)}")
+                partials.append(_join_summaries(group))
+                complete = False
+    try:
+        return model.invoke(_merge_messages(partials)), complete
+    except Exception as e:
+        print(f"Failed to merge webpage chunk summaries: {str(e)}")
+        return _join_summaries(partials), False
+
+
+async def _asummarize_in_chunks(webpage_content: str) -> Tuple[Summary, bool]:
+    """Summarize an oversized page in parallel chunks, then merge the chunk summaries.
+
+    Latency is bounded by the chunk size and the number of chunks in flight,
+    not by the length of the page.
+
+    Returns:
+        The summary, and whether every chunk and merge succeeded
+    """
+    model = get_summarization_model()
+    semaphore = asyncio.Semaphore(PAGE_SUMMARY_SETTINGS["max_concurrency"])
+
+    async def summarize(messages: list) -> Summary:
+        async with semaphore:
+            return await model.ainvoke(messages)
+
+    chunks = await asyncio.to_thread(split_by_tokens, webpage_content, PAGE_SUMMARY_SETTINGS["chunk_tokens"], SUMMARIZATION_MODEL_NAME)
+    results = await asyncio.gather(*(summarize(_summarization_messages(chunk)) for chunk in chunks), return_exceptions=True)
+    partials = []
+    complete = True
+    for result in results:
+        # A failing chunk loses only its own part of the page
+        if isinstance(result, BaseException):
+            print(f"Failed to summarize webpage chunk: {str(result)}")
+            complete = False
+        else:
+            partials.append(result)
+    if not partials:
+        raise ValueError("every chunk of the webpage failed to summarize")
+
+    for _ in range(PAGE_SUMMARY_SETTINGS["max_merge_rounds"]):
+        groups = _merge_groups(partials)
+        if len(groups) == 1:
+            break
+        merged = await asyncio.gather(*(summarize(_merge_messages(group)) for group in groups), return_exceptions=True)
+        partials = []
+        for group, result in zip(groups, merged):
+            # A failing merge keeps its group's summaries unmerged
+            if isinstance(result, BaseException):
+                print(f"Failed to merge webpage chunk summaries: {str(result)}")
+                partials.append(_join_summaries(group))
+                complete = False
+            else:
+                partials.append(result)
+    try:
+        return await model.ainvoke(_merge_messages(partials)), complete
+    except Exception as e:
+        print(f"Failed to merge webpage chunk summaries: {str(e)}")
+        return _join_summaries(partials), False
+
+
+def _merge_groups(partials: List[Summary]) -> List[List[Summary]]:
+    # Chunk summaries merged together must fit in one call. A summary is much shorter than
+    # max_page_tokens, so none has to be split across groups
+    groups, current, current_tokens = [], [], 0
+    for partial in partials:
+        tokens = count_tokens(_format_summary(partial), SUMMARIZATION_MODEL_NAME)
+        if current and current_tokens + tokens > PAGE_SUMMARY_SETTINGS["max_page_tokens"]:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(partial)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _merge_messages(partials: List[Summary]) -> list:
+    return [
+        HumanMessage(content=merge_webpage_summaries_prompt.format(
+            part_summaries="\n\n".join(_format_summary(partial) for partial in partials),
+            date=get_today_str()
+        ))
+    ]
+
+
+def _join_summaries(partials: List[Summary]) -> Summary:
+    return Summary(
+        summary="\n\n".join(partial.summary for partial in partials),
+        key_excerpts="\n".join(partial.key_excerpts for partial in partials),
+    )
+
+
+def _summary_cache_key(webpage_content: str) -> str:
+    # Only successful summaries are cached, so fallbacks are retried on the next hit. Chunked
+    # summaries also depend on the merge prompt, the page ceiling and the chunk size
+    return content_key(
+        webpage_content,
+        summarize_webpage_prompt,
+        merge_webpage_summaries_prompt,
+        str(PAGE_SUMMARY_SETTINGS["max_page_tokens"]),
+        str(PAGE_SUMMARY_SETTINGS["chunk_tokens"]),
+        SUMMARIZATION_MODEL_NAME,
+    )
+
+
+def _summarization_messages(webpage_content: str) -> list:
+    return [
+        HumanMessage(content=summarize_webpage_prompt.format(
+            webpage_content=webpage_content, 
+            date=get_today_str()
+        ))
+    ]
+
+
+def _format_summary(summary: Summary) -> str:
+    # Format summary with clear structure
+    return (
+        f"<summary>\n{summary.summary}\n</summary>\n\n"
+        f"<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
+    )
+
+
+def _truncate_webpage_content(webpage_content: str) -> str:
+    return webpage_content[:1000] + "..." if len(webpage_content) > 1000 else webpage_content
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from utils import get_message_string
+
+
+class TranscriptRenderer:
+    """Render a planner's message history as text, serializing each message only once.
+
+    The rendering of every message is cached by message id, so messages seen
+    in a previous planner iteration are not serialized again. Each iteration
+    still joins the cached renderings of the whole history into the transcript
+    it sends, which stays linear in the length of the history. When
+    full_research_results is set, ConductResearch results older than the last
+    full_research_results ones are shown as short digests carrying their
+    tool call id, so the prompt stops growing with every research summary.
+    """
+
+    def __init__(self, full_research_results: Optional[int] = None, digest_chars: int = 400, max_entries: int = 4096):
+        """
+        Args:
+            full_research_results: Most recent research results rendered in full, None to render all in full
+            digest_chars: Characters of a research result kept in its digest
+            max_entries: Renderings kept in the cache, least recently used ones are dropped
+        """
+        self.full_research_results = full_research_results
+        self.digest_chars = digest_chars
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, settings: Optional[dict]) -> "TranscriptRenderer":
+        """Build a TranscriptRenderer from the transcript section of a planner config."""
+        settings = dict(settings or {})
+        if not settings.pop("digest_research", False):
+            settings.pop("full_research_results", None)
+        return cls(**settings)
+
+    def render(self, messages: Sequence[BaseMessage]) -> str:
+        """Return the transcript of messages, as utils.get_buffer_string lays it out.
+
+        Args:
+            messages: Message history of the planner
+
+        Returns:
+            One line per message, older research results as digests when enabled
+        """
+        digested = self._digested(messages)
+        return "\n".join(self._rendering(message, index in digested) for index, message in enumerate(messages))
+
+    def _digested(self, messages: Sequence[BaseMessage]) -> set:
+        if self.full_research_results is None:
+            return set()
+        research = [index for index, message in enumerate(messages) if _is_research_result(message)]
+        kept = len(research) - self.full_research_results
+        return set(research[:max(kept, 0)])
+
+    def _rendering(self, message: BaseMessage, digest: bool) -> str:
+        if message.id is None:
+            # Not merged into the state yet, nothing stable to cache it under
+            return self._render(message, digest)
+        key = (message.id, digest)
+        with self._lock:
+            rendering = self._cache.get(key)
+            if rendering is not None:
+                self._cache.move_to_end(key)
+                return rendering
+        rendering = self._render(message, digest)
+        with self._lock:
+            self._cache[key] = rendering
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return rendering
+
+    def _render(self, message: BaseMessage, digest: bool) -> str:
+        if not digest:
+            return get_message_string(message)
+        return f"Tool: [research result {message.tool_call_id}, digest] {research_digest(message.text, self.digest_chars)}"
+
+
+def _is_research_result(message: BaseMessage) -> bool:
+    return isinstance(message, ToolMessage) and message.name == "ConductResearch"
+
+
+def research_digest(text: str, max_chars: int = 400) -> str:
+    """First max_chars characters of text on one line, cut at a word boundary."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
@@ -1,9 +1,13 @@
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
+from functools import lru_cache
 import json
 
-console = Console()
+
+@lru_cache(maxsize=1)
+def get_console():
+    """Return the shared rich Console, creating it on first use."""
+    from rich.console import Console
+    return Console()
+
 
 def format_message_content(message):
     """Convert message content to displayable string"""
@@ -38,6 +42,9 @@ def format_message_content(message):
 
 def format_messages(messages):
     """Format and display a list of messages with Rich formatting"""
+    from rich.panel import Panel
+
+    console = get_console()
     for m in messages:
         msg_type = m.__class__.__name__.replace('Message', '')
         content = format_message_content(m)
@@ -66,6 +73,9 @@ def show_prompt(prompt_text: str, title: str = "Prompt", border_style: str = "bl
         title: Title for the panel (default: "Prompt")
         border_style: Border color style (default: "blue")
     """
+    from rich.panel import Panel
+    from rich.text import Text
+
     # Create a formatted display of the prompt
     formatted_text = Text(prompt_text)
     formatted_text.highlight_regex(r'<[^>]+>', style="bold blue")  # Highlight XML tags
@@ -73,7 +83,7 @@ def show_prompt(prompt_text: str, title: str = "Prompt", border_style: str = "bl
     formatted_text.highlight_regex(r'###[^#\n]+', style="bold cyan")  # Highlight sub-headers
 
     # Display in a panel for better presentation
-    console.print(Panel(
+    get_console().print(Panel(
         formatted_text, 
         title=f"[bold green]{title}[/bold green]",
         border_style=border_style,
@@ -85,6 +95,35 @@ from collections.abc import Sequence
 from langchain_core.messages import BaseMessage, HumanMessage, ChatMessage, FunctionMessage, AIMessage, ToolMessage, SystemMessage
 
 
+def get_message_string(m: BaseMessage, human_prefix: str = "Human", ai_prefix: str = "AI") -> str:
+    """Convert one message to its line of get_buffer_string.
+
+    Raises:
+        ValueError: If an unsupported message type is encountered.
+    """
+    if isinstance(m, HumanMessage):
+        role = human_prefix
+    elif isinstance(m, AIMessage):
+        role = ai_prefix
+    elif isinstance(m, SystemMessage):
+        role = "System"
+    elif isinstance(m, FunctionMessage):
+        role = "Function"
+    elif isinstance(m, ToolMessage):
+        role = "Tool"
+    elif isinstance(m, ChatMessage):
+        role = m.role
+    else:
+        msg = f"Got unsupported message type: {m}"
+        raise ValueError(msg)  # noqa: TRY004
+    message = f"{role}: {m.text}"
+    if isinstance(m, AIMessage) and hasattr(m, "tool_calls"):
+        message += f"{m.tool_calls}"
+    elif isinstance(m, AIMessage) and "tool_calls" in m.additional_kwargs:
+        message += f"{m.additional_kwargs['function_call']}"
+    return message
+
+
 def get_buffer_string(
     messages: Sequence[BaseMessage], human_prefix: str = "Human", ai_prefix: str = "AI"
 ) -> str:
@@ -113,28 +152,4 @@ def get_buffer_string(
         # -> "Human: Hi, how are you?\nAI: Good, how are you?"
         ```
     """
-    string_messages = []
-    for m in messages:
-        if isinstance(m, HumanMessage):
-            role = human_prefix
-        elif isinstance(m, AIMessage):
-            role = ai_prefix
-        elif isinstance(m, SystemMessage):
-            role = "System"
-        elif isinstance(m, FunctionMessage):
-            role = "Function"
-        elif isinstance(m, ToolMessage):
-            role = "Tool"
-        elif isinstance(m, ChatMessage):
-            role = m.role
-        else:
-            msg = f"Got unsupported message type: {m}"
-            raise ValueError(msg)  # noqa: TRY004
-        message = f"{role}: {m.text}"
-        if isinstance(m, AIMessage) and hasattr(m, "tool_calls"):
-            message += f"{m.tool_calls}"
-        elif isinstance(m, AIMessage) and "tool_calls" in m.additional_kwargs:
-            message += f"{m.additional_kwargs['function_call']}"
-        string_messages.append(message)
-
-    return "\n".join(string_messages)
+    return "\n".join(get_message_string(m, human_prefix, ai_prefix) for m in messages)